@@ -17,19 +17,61 @@ really happens in space!
 
 The space bar, when pressed, fires a laser missile.
 
+F3 shows or hides the performance overlay.
+
 The number of laser missiles is shown in the Laser bar and is initially
-200 missiles. Hitting the gold asteroid reloads missiles.
+200 missiles. Hitting the gold asteroid reloads missiles. Large asteroids
+break into smaller fragments when hit; the smallest ones are destroyed.
 
 Initially you have 4 lives - remaining lives are shown as mini space ships.
 
 Press the 'B' key to start the game.
+
+Run with --measure-ship to time the ship's frame cache against rotating
+it every frame.
+Run with --bake-assets once to pack the images into cache/ for a faster
+start; the PNGs are used whenever that cache is missing or out of date.
+Run with --record FILE to save the session's seed and key presses, and with
+--replay FILE to play it back headless and as fast as possible, checking that
+every game ends on the recorded score. Add --watch to see the replay.
+--render-fps sets the display rate; the game itself always steps at FPS so
+it plays at the same speed however fast the screen is drawn.
+The game is drawn at the display's resolution scaled down to fit within
+LOGICAL_SIZE and the display scales it up to fill the screen, so larger
+monitors cost no more to draw. --resolution WxH picks another size.
+--capture DIR saves the frames shown as PNGs, or as one raw RGB stream with
+--capture-format raw, from a separate process, and makes headless runs and
+replays draw every frame; frames it cannot keep up with are dropped and
+counted. --capture-size and --capture-fps set the size and rate of the
+recording.
+Run with --headless FRAMES to simulate the game without a display or sound
+card and report how many frames per second the update path manages.
+--vectorized moves bullets and rocks into NumPy arrays for large numbers of
+them; numpy is then also required.
 """
 
+import argparse
+import csv
+import json
+import math
+import multiprocessing as mp
 import os
+import queue
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
 from os import path
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import random
 import pygame as pg
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 os.environ['SDL_VIDEO_CENTERED'] = '1'
 vec = pg.math.Vector2
 
@@ -41,14 +83,81 @@ ORANGE = (255, 165, 0)
 RED = (255, 0, 0)
 FONT_NAME = 'arial'
 FPS = 60
+STEP_MS = 1000 / FPS
+SIM_DT = STEP_MS / 100.0
+MAX_STEPS = 5
 SHIP_ROT_SPEED = 20
 SHIP_VEL = 35
+SHIP_SPACING = 80
 BULLET_VEL = 50
 ROCK_VEL = 5
 WEAPON_OFFSET = vec(40, 0)
 AST_RANGE = 7
 POWERUP_PCT = 3
 HS_FILE = "highscore.txt"
+ROCK_SIZE = (60, 60)
+ROCK_SIZES = (ROCK_SIZE, (38, 38), (22, 22))
+FRAGMENTS = 2
+FRAGMENT_SPREAD = 40
+FRAGMENT_SPEEDUP = 1.3
+BALL_SIZE = (40, 40)
+ROT_STEP = 3
+SHIP_ROT_STEP = 2
+TEXT_CACHE_SIZE = 64
+DIRTY_RECTS = False
+DIRTY_FULL_PCT = 50
+HEADLESS_SIZE = (1920, 1080)
+LOGICAL_SIZE = (1920, 1080)
+CELL_SIZE = 128
+ENTITY_CAPACITY = 256
+PARTICLE_CAPACITY = 4096
+PARTICLE_BURST = 24
+PARTICLE_SPEED = 40
+PARTICLE_DRAG = 0.94
+PARTICLE_LIFE = 600
+PARTICLE_SIZE = 3
+PARTICLE_COLORS = ((255, 240, 200), ORANGE, (200, 90, 30), (110, 110, 110))
+BOX_SLACK = 4
+BULLET_POOL_SIZE = 32
+EXPLOSION_POOL_SIZE = 16
+PROFILE_WINDOW = 120
+PROFILE_REFRESH = 15
+PROFILE_PHASES = ('events', 'ship', 'entities', 'bullets', 'rocks',
+                  'explosions', 'ball', 'particles', 'spawn_rocks',
+                  'hit_ship', 'hit_rocks', 'spawn_ball', 'hit_ball', 'audio',
+                  'draw', 'frame', 'allocs')
+QUALITY_WINDOW = 30
+QUALITY_UP_PCT = 70
+QUALITY_LEVELS = ((ROT_STEP, 1, True, None, 1.0),
+                  (ROT_STEP * 2, 1, True, 24, 1.0),
+                  (ROT_STEP * 2, 2, False, 12, 0.5),
+                  (ROT_STEP * 4, 3, False, 6, 0.25))
+EXPLOSION_SIZES = (75, 40, 100)
+EXPLOSION_FRAME_MS = 20
+CACHE_DIR = 'cache'
+ATLAS_FILE = 'atlas.rgba'
+ATLAS_INDEX = 'atlas.json'
+ATLAS_WIDTH = 2048
+ATLAS_VERSION = 1
+LOADER_WORKERS = 4
+MIXER_CHANNELS = 24
+MUSIC_CHANNEL = 0
+VOICE_GROUPS = (('weapons', 8), ('explosions', 12))
+INPUT_KEYS = (pg.K_LEFT, pg.K_RIGHT, pg.K_UP, pg.K_SPACE)
+LOG_MAGIC = b'ASTR'
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct('<4sHIdHHB')
+LOG_RUN = struct.Struct('<BH')
+LOG_COUNT = struct.Struct('<I')
+DEMO_SCRIPT = (((pg.K_LEFT, pg.K_SPACE),) * 40 + ((pg.K_UP,),) * 15
+               + ((pg.K_RIGHT, pg.K_SPACE),) * 30 + ((pg.K_SPACE,),) * 20)
+ROT_CACHE_BUDGET = 32 * 1024 * 1024
+SCORE_HISTORY = 1000
+CAPTURE_SLOTS = 8
+CAPTURE_FRAME = 'frame_{:06d}.png'
+CAPTURE_STREAM = 'capture.rgb'
+CAPTURE_INFO = 'capture.json'
+CAPTURE_NICE = 10
 
 """Now set layers - instructs pygame which layer to put on top"""
 EXPLOSION_LAYER = 3
@@ -56,6 +165,928 @@ SHIP_LAYER = 2
 BULLET_LAYER = 1
 ROCK_LAYER = 1
 
+class RotationCache:
+    """Shared cache of pre-scaled, pre-rotated sprite frames.
+
+    Frames are keyed by (image, size, angle) with the angle quantized to
+    ``step`` degrees. They are rendered lazily the first time they are
+    asked for and the least recently used ones are dropped once the cache
+    holds more than ``budget`` bytes of pixels. Collision masks are built
+    the same way on first use and dropped with their frames.
+    """
+
+    def __init__(self, step=ROT_STEP, budget=ROT_CACHE_BUDGET):
+        self.step = step
+        self.budget = budget
+        self.used = 0
+        self.frames = OrderedDict()
+        self.masks = {}
+        self.scaled = {}
+
+    def quantize(self, angle):
+        """Snap an angle to the nearest cached step."""
+        return int(round(angle / self.step) * self.step) % 360
+
+    def prefill(self, image, size=None):
+        """Render every step of image up front."""
+        for angle in range(0, 360, self.step):
+            self.get(image, size, angle)
+
+    def get(self, image, size, angle):
+        """Return (surface, rect) for image scaled to size and rotated.
+
+        A size of None keeps the image at its native size.
+        """
+        key = (image, size, self.quantize(angle))
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+            return frame
+        base = self.scaled.get((image, size))
+        if base is None:
+            if size is None:
+                base = image
+            else:
+                base = pg.transform.scale(image, size)
+            self.scaled[(image, size)] = base
+        surface = pg.transform.rotate(base, key[2])
+        frame = (surface, surface.get_rect())
+        self.frames[key] = frame
+        self.used += surface.get_width() * surface.get_height() * \
+            surface.get_bytesize()
+        while (self.budget is not None and self.used > self.budget
+               and len(self.frames) > 1):
+            old_key, (old, _) = self.frames.popitem(last=False)
+            self.masks.pop(old_key, None)
+            self.used -= old.get_width() * old.get_height() * \
+                old.get_bytesize()
+        return frame
+
+    def mask(self, image, size, angle):
+        """Return the collision mask of the frame get() gives."""
+        surface, _ = self.get(image, size, angle)
+        key = (image, size, self.quantize(angle))
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = pg.mask.from_surface(surface)
+            self.masks[key] = mask
+        return mask
+
+class TextRenderer:
+    """Cache of fonts per size and of rendered text surfaces.
+
+    Surfaces are keyed by (text, size, color) and the least recently used
+    ones are dropped once more than ``limit`` are held, so strings that do
+    not change between frames are rendered only once.
+    """
+
+    def __init__(self, font_name, limit=TEXT_CACHE_SIZE):
+        self.font_name = font_name
+        self.limit = limit
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def font(self, size):
+        """Return the font for size, creating it on first use."""
+        font = self.fonts.get(size)
+        if font is None:
+            font = pg.font.Font(self.font_name, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color):
+        """Return the antialiased surface for text."""
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = self.font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.limit:
+            self.surfaces.popitem(last=False)
+        return surface
+
+def collide_mask(left, right):
+    """Pixel-accurate collided callback for sprites with a mask.
+
+    The rects are compared first so that most pairs never reach the
+    mask overlap.
+    """
+    if not left.rect.colliderect(right.rect):
+        return False
+    offset = (right.rect.x - left.rect.x, right.rect.y - left.rect.y)
+    return left.mask.overlap(right.mask, offset) is not None
+
+class Backdrop:
+    """Star field with the debris layer scrolled across it.
+
+    Both layers are scaled to size once. The composed background is kept
+    and only rebuilt when the debris offset changes, so most frames draw
+    it with a single opaque blit. With show_debris off only the stars are
+    drawn and the background never changes.
+    """
+
+    def __init__(self, stars, debris, size):
+        self.size = tuple(size)
+        self.stars = self.fit(stars).convert()
+        self.debris = self.fit(debris).convert_alpha()
+        self.surface = pg.Surface(self.size).convert()
+        self.show_debris = True
+        self.key = None
+
+    def fit(self, image):
+        """Return image scaled to the backdrop size."""
+        if image.get_size() == self.size:
+            return image
+        return pg.transform.smoothscale(image, self.size)
+
+    def stale(self, offset):
+        """Return True if get(offset) has to rebuild the background."""
+        if not self.show_debris:
+            offset = None
+        return self.key != (offset, self.show_debris)
+
+    def get(self, offset):
+        """Return the background with the debris offset pixels across."""
+        if self.stale(offset):
+            self.surface.blit(self.stars, (0, 0))
+            if self.show_debris:
+                self.surface.blit(self.debris, (offset - self.size[0], 0))
+                self.surface.blit(self.debris, (offset, 0))
+            else:
+                offset = None
+            self.key = (offset, self.show_debris)
+        return self.surface
+
+class SpatialHash:
+    """Uniform grid broadphase for sprite collisions.
+
+    spritecollide() and groupcollide() take the same arguments and give
+    the same results as their pg.sprite namesakes, but the collided
+    callback only sees pairs that share a grid cell. A sprite is binned by
+    the box its scaled rect can reach. Cells are not bounded by the
+    screen, so rocks whose wrapped rect hangs past an edge are still
+    binned correctly.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cover(self, sprite, collided):
+        """Return the range of cells sprite can touch under collided."""
+        rect = sprite.rect
+        ratio = getattr(collided, 'ratio', 1.0)
+        reach = 0.5 * math.hypot(rect.width, rect.height) * ratio + 1
+        size = self.cell_size
+        return (int((rect.centerx - reach) // size),
+                int((rect.centery - reach) // size),
+                int((rect.centerx + reach) // size),
+                int((rect.centery + reach) // size))
+
+    def build(self, sprites, collided):
+        """Bin sprites into the grid, replacing what was there."""
+        self.cells = cells = {}
+        for sprite in sprites:
+            left, top, right, bottom = self.cover(sprite, collided)
+            for x in range(left, right + 1):
+                for y in range(top, bottom + 1):
+                    cell = cells.get((x, y))
+                    if cell is None:
+                        cells[(x, y)] = [sprite]
+                    else:
+                        cell.append(sprite)
+
+    def clear(self):
+        """Drop every binned sprite."""
+        self.cells = {}
+
+    def query(self, sprite, collided):
+        """Return the binned sprites sharing a cell with sprite."""
+        left, top, right, bottom = self.cover(sprite, collided)
+        found = {}
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                for other in self.cells.get((x, y), ()):
+                    found[other] = None
+        return found
+
+    def spritecollide(self, sprite, group, dokill, collided):
+        """Return the sprites in group that collide with sprite."""
+        if not group:
+            return []
+        self.build(group, collided)
+        hits = [other for other in self.query(sprite, collided)
+                if collided(sprite, other)]
+        if dokill:
+            for other in hits:
+                other.kill()
+        return hits
+
+    def groupcollide(self, groupa, groupb, dokilla, dokillb, collided):
+        """Return a dict of sprites in groupa to those they hit in groupb."""
+        crashed = {}
+        if not groupa or not groupb:
+            return crashed
+        self.build(groupb, collided)
+        for sprite in groupa.sprites():
+            hits = [other for other in self.query(sprite, collided)
+                    if other in groupb and collided(sprite, other)]
+            if hits:
+                crashed[sprite] = hits
+                if dokillb:
+                    for other in hits:
+                        other.kill()
+        if dokilla:
+            for sprite in crashed:
+                sprite.kill()
+        return crashed
+
+class SpritePool:
+    """Free list of reusable sprites with usage counters.
+
+    acquire() hands out a released sprite if there is one (a hit) or
+    builds one with factory (a miss), then calls its reset() with the
+    given arguments. Pooled sprites return themselves through release()
+    when they are killed.
+    """
+
+    def __init__(self, factory, size=0):
+        self.factory = factory
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+        self.in_use = 0
+        self.high_water = 0
+        for count in range(size):
+            self.free.append(self.make())
+
+    def make(self):
+        """Build a new sprite with factory and tie it to this pool."""
+        sprite = self.factory()
+        sprite.pool = self
+        return sprite
+
+    def acquire(self, *args):
+        """Return a live sprite reset with args."""
+        if self.free:
+            sprite = self.free.pop()
+            self.hits += 1
+        else:
+            sprite = self.make()
+            self.misses += 1
+        self.in_use += 1
+        self.high_water = max(self.high_water, self.in_use)
+        sprite.reset(*args)
+        return sprite
+
+    def release(self, sprite):
+        """Take a killed sprite back for reuse."""
+        self.in_use -= 1
+        self.free.append(sprite)
+
+    def stats(self, prefix=''):
+        """Return the usage counters, their names led by prefix."""
+        counts = {'free': len(self.free), 'in_use': self.in_use,
+                  'hits': self.hits, 'misses': self.misses,
+                  'high_water': self.high_water}
+        return {prefix + name: count for name, count in counts.items()}
+
+class FrameProfiler:
+    """Per-frame phase timer with rolling averages.
+
+    start() opens a frame, lap(name) charges the time since the last lap
+    to name and end() closes the frame with its entity counts and the net
+    change in allocated memory blocks. The last ``window`` frames are kept
+    for the overlay. If out is a file name every frame is also written to
+    it, as CSV when it ends in .csv and as JSON lines otherwise. The CSV
+    columns are PROFILE_PHASES, which every lap must be one of, then the
+    counts, so phases a frame skipped are written as 0.
+    """
+
+    def __init__(self, window=PROFILE_WINDOW, out=None):
+        self.frames = deque(maxlen=window)
+        self.record = {}
+        self.last = self.begin = time.perf_counter()
+        self.blocks = sys.getallocatedblocks()
+        self.file = None
+        self.writer = None
+        if out is not None:
+            self.file = open(out, 'w', newline='')
+            self.csv = out.endswith('.csv')
+
+    def start(self):
+        self.record = {}
+        self.last = self.begin = time.perf_counter()
+        self.blocks = sys.getallocatedblocks()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.record[name] = self.record.get(name, 0.0) + (
+            now - self.last) * 1000
+        self.last = now
+
+    def end(self, **counts):
+        record = self.record
+        record['frame'] = (time.perf_counter() - self.begin) * 1000
+        record['allocs'] = sys.getallocatedblocks() - self.blocks
+        record.update(counts)
+        self.frames.append(record)
+        if self.file is None:
+            return
+        if not self.csv:
+            self.file.write(json.dumps(record) + '\n')
+            return
+        if self.writer is None:
+            fields = list(PROFILE_PHASES) + [
+                name for name in record if name not in PROFILE_PHASES]
+            self.writer = csv.DictWriter(self.file, fields, restval=0)
+            self.writer.writeheader()
+        self.writer.writerow(record)
+
+    def averages(self):
+        """Return the mean of every field over the kept frames."""
+        totals = {}
+        for record in self.frames:
+            for name, value in record.items():
+                totals[name] = totals.get(name, 0) + value
+        return {name: total / len(self.frames)
+                for name, total in totals.items()}
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def encode_frames(name, size, depth, masks, folder, fmt, fps, full, free):
+    """Capture process: write the frames a FrameCapture queues.
+
+    Each (slot, number) that arrives on full names a frame of pixels in
+    the shared memory block name, laid out as a size surface of depth
+    bits with masks. The slot is handed back on free once the frame is
+    written. Runs at a lower priority than the game until None arrives.
+    """
+    if hasattr(os, 'nice'):
+        os.nice(CAPTURE_NICE)
+    block = shared_memory.SharedMemory(name=name)
+    frame = pg.Surface(size, 0, depth, masks)
+    frame_bytes = frame.get_pitch() * size[1]
+    stream = None
+    if fmt == 'raw':
+        stream = open(path.join(folder, CAPTURE_STREAM), 'wb')
+    written = 0
+    while True:
+        item = full.get()
+        if item is None:
+            break
+        slot, number = item
+        start = slot * frame_bytes
+        with block.buf[start:start + frame_bytes] as pixels, \
+                memoryview(frame.get_view('0')) as view:
+            view[:] = pixels
+        if stream is None:
+            pg.image.save(frame, path.join(
+                folder, CAPTURE_FRAME.format(number)))
+        else:
+            stream.write(pg.image.tobytes(frame, 'RGB'))
+        written += 1
+        free.put(slot)
+    if stream is not None:
+        stream.close()
+        with open(path.join(folder, CAPTURE_INFO), 'w') as file:
+            json.dump({'width': size[0], 'height': size[1], 'fps': fps,
+                       'pix_fmt': 'rgb24', 'frames': written}, file)
+    block.close()
+
+class FrameCapture:
+    """Saves presented frames to folder from a separate process.
+
+    grab() copies the screen's pixels, scaled to size if that differs,
+    straight into a free slot of a ring of ``slots`` frames in shared
+    memory and queues it, at most fps times a second of game time. The
+    encode_frames() process writes each one as a numbered PNG, or with
+    fmt 'raw' appends it as packed RGB to one CAPTURE_STREAM that
+    CAPTURE_INFO describes. Encoding in its own process keeps it from
+    holding the game's GIL. When every slot is still waiting to be written
+    the frame is dropped and counted rather than holding up the game.
+    """
+
+    def __init__(self, screen, folder, size=None, fps=FPS, fmt='png',
+                 slots=CAPTURE_SLOTS):
+        os.makedirs(folder, exist_ok=True)
+        self.size = tuple(size or screen.get_size())
+        self.interval = 1000 / fps
+        self.next = None
+        self.scaled = None
+        if (self.size != screen.get_size()
+                or screen.get_pitch() != screen.get_width() * 4):
+            self.scaled = pg.Surface(self.size, 0, 32)
+        layout = self.scaled or screen
+        self.frame_bytes = layout.get_pitch() * self.size[1]
+        self.block = shared_memory.SharedMemory(
+            create=True, size=self.frame_bytes * slots)
+        self.slots = list(range(slots))
+        context = mp.get_context('spawn')
+        self.full = context.Queue()
+        self.free = context.Queue()
+        self.captured = self.dropped = self.written = 0
+        self.process = context.Process(
+            target=encode_frames, daemon=True,
+            args=(self.block.name, self.size, layout.get_bitsize(),
+                  layout.get_masks(), folder, fmt, fps, self.full,
+                  self.free))
+        self.process.start()
+
+    def collect(self):
+        """Take back the slots the encoder has finished with."""
+        while True:
+            try:
+                self.slots.append(self.free.get_nowait())
+            except queue.Empty:
+                return
+            self.written += 1
+
+    def grab(self, surface, now):
+        """Queue a copy of surface if a frame is due at now ms."""
+        if self.next is not None and now < self.next:
+            return
+        self.next = max(self.next or now, now - self.interval) + \
+            self.interval
+        self.collect()
+        if not self.slots:
+            self.dropped += 1
+            return
+        slot = self.slots.pop()
+        if self.scaled is not None:
+            if surface.get_size() == self.size:
+                self.scaled.blit(surface, (0, 0))
+            else:
+                pg.transform.smoothscale(surface, self.size, self.scaled)
+            surface = self.scaled
+        start = slot * self.frame_bytes
+        self.block.buf[start:start + self.frame_bytes] = surface.get_view('0')
+        self.full.put((slot, self.captured))
+        self.captured += 1
+
+    def metrics(self):
+        return {'capture_frames': self.captured,
+                'capture_dropped': self.dropped}
+
+    def close(self):
+        """Finish writing the queued frames and stop the encoder."""
+        self.full.put(None)
+        self.process.join()
+        self.collect()
+        self.block.close()
+        self.block.unlink()
+
+class QualityGovernor:
+    """Steps the drawing quality down when frames run over budget.
+
+    Each of QUALITY_LEVELS is (rotation step of the rock, ball and
+    bullet frames, explosion frames to advance per update, whether to
+    draw the debris layer, most explosions at once or None, fraction of
+    particles to emit). observe() is given every frame's time; once window
+    frames have passed since the last change it moves one level down if
+    their average is over budget_ms and one level up if it is under
+    up_pct of it. The gap between the two keeps the level from flapping.
+    A disabled governor stays at level 0.
+    """
+
+    def __init__(self, budget_ms, levels=QUALITY_LEVELS,
+                 window=QUALITY_WINDOW, up_pct=QUALITY_UP_PCT, enabled=True):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.window = window
+        self.up_pct = up_pct
+        self.enabled = enabled
+        self.level = 0
+        self.changes = 0
+        self.times = []
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, frame_ms):
+        """Record a frame time and return True if the level changed."""
+        if not self.enabled:
+            return False
+        self.times.append(frame_ms)
+        if len(self.times) < self.window:
+            return False
+        average = sum(self.times) / len(self.times)
+        self.times = []
+        level = self.level
+        if average > self.budget_ms:
+            level = min(level + 1, len(self.levels) - 1)
+        elif average * 100 < self.budget_ms * self.up_pct:
+            level = max(level - 1, 0)
+        if level == self.level:
+            return False
+        self.level = level
+        self.changes += 1
+        return True
+
+    def metrics(self):
+        """Return the level and the number of changes so far."""
+        return {'quality_level': self.level,
+                'quality_changes': self.changes}
+
+class AssetAtlas:
+    """Baked atlas of the converted, pre-scaled game images.
+
+    bake() packs named surfaces onto shelves of one RGBA image, written
+    raw next to a JSON index of their rects, how they are drawn and the
+    size and mtime of every source PNG. load() reads the pixels back in
+    one go and cuts the surfaces out again. It returns None when the cache
+    is missing or was baked from different PNGs or settings.
+    """
+
+    def __init__(self, folder, cache_dir):
+        self.folder = folder
+        self.pixels = path.join(cache_dir, ATLAS_FILE)
+        self.index = path.join(cache_dir, ATLAS_INDEX)
+
+    def stamp(self):
+        """Return what the cache must have been baked from to be current."""
+        sources = {}
+        for name in sorted(os.listdir(self.folder)):
+            if name.endswith('.png'):
+                info = os.stat(path.join(self.folder, name))
+                sources[name] = [info.st_size, info.st_mtime_ns]
+        return {'version': ATLAS_VERSION, 'rock_size': list(ROCK_SIZE),
+                'explosion_sizes': list(EXPLOSION_SIZES),
+                'sources': sources}
+
+    def bake(self, images):
+        """Pack images, a dict of name to surface, into the cache."""
+        order = sorted(images, key=lambda name: -images[name].get_height())
+        entries = []
+        x = y = shelf = 0
+        for name in order:
+            width, height = images[name].get_size()
+            if x + width > ATLAS_WIDTH:
+                x, y, shelf = 0, y + shelf, 0
+            entries.append((name, x, y, width, height))
+            x += width
+            shelf = max(shelf, height)
+        atlas = pg.Surface((ATLAS_WIDTH, y + shelf), pg.SRCALPHA, 32)
+        index = []
+        for name, x, y, width, height in entries:
+            image = images[name]
+            if image.get_colorkey() is not None:
+                kind = 'colorkey'
+            elif image.get_flags() & pg.SRCALPHA:
+                kind = 'alpha'
+            else:
+                kind = 'opaque'
+            copy = image.copy()
+            copy.set_colorkey(None)
+            atlas.blit(copy, (x, y), special_flags=pg.BLEND_RGBA_MAX)
+            index.append([name, x, y, width, height, kind])
+        os.makedirs(path.dirname(self.pixels), exist_ok=True)
+        with open(self.pixels, 'wb') as f:
+            f.write(pg.image.tobytes(atlas, 'RGBA'))
+        with open(self.index, 'w') as f:
+            json.dump({'stamp': self.stamp(), 'size': atlas.get_size(),
+                       'images': index}, f)
+
+    def load(self):
+        """Return a dict of name to surface, or None if not current."""
+        return self.unpack(self.read())
+
+    def read(self):
+        """Return the index and raw pixels, or None if not current.
+
+        This only touches files, so it can run on a worker thread.
+        """
+        try:
+            with open(self.index) as f:
+                index = json.load(f)
+            if index['stamp'] != self.stamp():
+                print("Asset cache is out of date, loading the PNGs")
+                return None
+            with open(self.pixels, 'rb') as f:
+                return index, f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def unpack(self, baked):
+        """Cut the surfaces out of what read() returned."""
+        if baked is None:
+            return None
+        index, pixels = baked
+        atlas = pg.image.frombuffer(pixels, tuple(index['size']), 'RGBA')
+        blended = atlas.convert_alpha()
+        images = {}
+        for name, x, y, width, height, kind in index['images']:
+            rect = (x, y, width, height)
+            if kind == 'alpha':
+                images[name] = blended.subsurface(rect)
+            else:
+                images[name] = atlas.subsurface(rect).convert()
+                if kind == 'colorkey':
+                    images[name].set_colorkey(BLACK)
+        return images
+
+class AssetLoader:
+    """Worker pool that decodes images and sounds off the main thread.
+
+    Every method returns a future. Surfaces come back unconverted, since
+    convert() needs the display and must run on the main thread.
+    """
+
+    def __init__(self, workers=LOADER_WORKERS):
+        self.pool = ThreadPoolExecutor(workers)
+
+    def call(self, function, *args):
+        return self.pool.submit(function, *args)
+
+    def image(self, file):
+        return self.pool.submit(pg.image.load, file)
+
+    def sound(self, file):
+        return self.pool.submit(pg.mixer.Sound, file)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+class MusicPlayer:
+    """Plays fully decoded music loops on a reserved mixer channel.
+
+    Tracks are added as futures from AssetLoader.sound(). Switching track
+    never waits on a file: a track that is still decoding starts from
+    poll() once it is ready, and one that failed to load stays silent.
+    """
+
+    def __init__(self, channel=MUSIC_CHANNEL):
+        pg.mixer.set_reserved(channel + 1)
+        self.channel = pg.mixer.Channel(channel)
+        self.tracks = {}
+        self.pending = None
+
+    def add(self, name, future):
+        self.tracks[name] = future
+
+    def play(self, name, volume):
+        """Loop track name at volume, as soon as it has been decoded."""
+        self.pending = (name, volume)
+        self.poll()
+
+    def poll(self):
+        """Start the requested track if it has finished decoding."""
+        if self.pending is None:
+            return
+        name, volume = self.pending
+        future = self.tracks.get(name)
+        if future is not None and not future.done():
+            return
+        self.pending = None
+        if future is None or future.exception() is not None:
+            return
+        self.channel.play(future.result(), loops=-1)
+        self.channel.set_volume(volume)
+
+    def fadeout(self, ms):
+        self.pending = None
+        self.channel.fadeout(ms)
+
+class VoiceManager:
+    """Sound effect player with channel groups and voice limits.
+
+    Each group owns a fixed block of mixer channels after the music
+    channel. play() only queues a sound; flush() starts the queued sounds
+    once per frame, so identical triggers in one frame are coalesced into
+    one voice. A sound already playing on ``cap`` voices is dropped. When
+    its group has no free channel it steals the lowest priority, oldest
+    voice, unless every voice outranks it, in which case it is dropped.
+    """
+
+    def __init__(self, first=MUSIC_CHANNEL + 1, groups=VOICE_GROUPS):
+        self.groups = {}
+        for name, size in groups:
+            self.groups[name] = [pg.mixer.Channel(index) for index in
+                                 range(first, first + size)]
+            first += size
+        pg.mixer.set_reserved(first)
+        self.sounds = {}
+        self.voices = {}
+        self.queued = []
+        self.counts = dict.fromkeys(
+            ('played', 'coalesced', 'dropped', 'stolen'), 0)
+        self.second = dict(self.counts)
+        self.second_start = 0
+        self.per_second = dict(self.counts)
+
+    def add(self, name, sound, group, cap, priority):
+        """Register sound under name, playing in group."""
+        self.sounds[name] = (sound, group, cap, priority)
+
+    def play(self, name):
+        """Queue sound name for the next flush()."""
+        if name in self.queued:
+            self.counts['coalesced'] += 1
+        else:
+            self.queued.append(name)
+
+    def flush(self, now):
+        """Start the sounds queued this frame; now is in milliseconds."""
+        for name in self.queued:
+            sound, group, cap, priority = self.sounds[name]
+            channels = self.groups[group]
+            busy = [channel for channel in channels
+                    if channel.get_busy() and channel in self.voices]
+            if sum(self.voices[channel][0] == name for channel in busy) >= cap:
+                self.counts['dropped'] += 1
+                continue
+            free = [channel for channel in channels if channel not in busy]
+            if free:
+                channel = free[0]
+            else:
+                channel = min(busy, key=lambda channel: (
+                    self.sounds[self.voices[channel][0]][3],
+                    self.voices[channel][1]))
+                if self.sounds[self.voices[channel][0]][3] > priority:
+                    self.counts['dropped'] += 1
+                    continue
+                channel.stop()
+                self.counts['stolen'] += 1
+            channel.play(sound)
+            self.voices[channel] = (name, now)
+            self.counts['played'] += 1
+        self.queued = []
+        if now - self.second_start >= 1000:
+            self.per_second = {name: count - self.second[name]
+                               for name, count in self.counts.items()}
+            self.second = dict(self.counts)
+            self.second_start = now
+
+    def rates(self):
+        """Return the counters for the last full second."""
+        return {'sounds_' + name: count
+                for name, count in self.per_second.items()}
+
+class KeyState(frozenset):
+    """Set of pressed keys indexable like pg.key.get_pressed()."""
+
+    __getitem__ = frozenset.__contains__
+
+class ScriptedInput:
+    """Input source that replays a list of pressed keys, one per frame.
+
+    Each entry of script is an iterable of key constants held down for
+    that frame. The script repeats once it runs out.
+    """
+
+    def __init__(self, script):
+        self.script = [KeyState(keys) for keys in script]
+        self.frame = 0
+
+    def get_pressed(self):
+        keys = self.script[self.frame % len(self.script)]
+        self.frame += 1
+        return keys
+
+class BotPilot:
+    """Input source that turns towards the nearest rock and fires.
+
+    It thrusts forward while there is nothing to shoot at.
+    """
+
+    def __init__(self, game, tolerance=10):
+        self.game = game
+        self.tolerance = tolerance
+
+    def get_pressed(self):
+        game = self.game
+        ship = game.ship
+        if game.engine is not None:
+            live = game.engine.rocks.live()
+            targets = game.engine.rocks.centers(live).tolist()
+        else:
+            targets = [rock.rect.center for rock in game.rocks]
+        if not targets:
+            return KeyState((pg.K_UP,))
+        x, y = ship.rect.center
+        tx, ty = min(targets, key=lambda t: (t[0] - x) ** 2 + (t[1] - y) ** 2)
+        wanted = -math.degrees(math.atan2(ty - y, tx - x))
+        turn = (wanted - ship.rot + 180) % 360 - 180
+        keys = []
+        if turn > self.tolerance:
+            keys.append(pg.K_LEFT)
+        elif turn < -self.tolerance:
+            keys.append(pg.K_RIGHT)
+        else:
+            keys.append(pg.K_SPACE)
+        return KeyState(keys)
+
+def key_mask(keys):
+    """Pack the state of INPUT_KEYS into one byte."""
+    mask = 0
+    for bit, key in enumerate(INPUT_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+def mask_keys(mask):
+    """Unpack a byte from key_mask() into a KeyState."""
+    return KeyState(key for bit, key in enumerate(INPUT_KEYS)
+                    if mask & 1 << bit)
+
+class InputRecorder:
+    """Input source that logs one key mask per frame.
+
+    Keys come from source, or the keyboard when it is None, and are handed
+    on exactly as they will be replayed.
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.masks = bytearray()
+
+    def get_pressed(self):
+        if self.source is not None:
+            keys = self.source.get_pressed()
+        else:
+            keys = pg.key.get_pressed()
+        mask = key_mask(keys)
+        self.masks.append(mask)
+        return mask_keys(mask)
+
+class ReplayInput:
+    """Input source that plays back recorded key masks."""
+
+    def __init__(self, masks):
+        self.masks = masks
+        self.frame = 0
+
+    def get_pressed(self):
+        mask = self.masks[self.frame]
+        self.frame += 1
+        return mask_keys(mask)
+
+class SessionLog:
+    """Everything needed to re-run a recorded session bit for bit.
+
+    That is the seed, the frame dt, the screen size, whether the
+    vectorized engine was used, the key mask of every frame and the final
+    score of every game. On disk it is a fixed header, the masks
+    run-length encoded as (mask, count) pairs, then the scores.
+    """
+
+    def __init__(self, seed, dt, size, vectorized, masks=b'', scores=()):
+        self.seed = seed
+        self.dt = dt
+        self.size = size
+        self.vectorized = vectorized
+        self.masks = bytes(masks)
+        self.scores = list(scores)
+
+    def save(self, file):
+        runs = []
+        for mask in self.masks:
+            if runs and runs[-1][0] == mask and runs[-1][1] < 0xFFFF:
+                runs[-1][1] += 1
+            else:
+                runs.append([mask, 1])
+        with open(file, 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, self.seed,
+                                    self.dt, self.size[0], self.size[1],
+                                    self.vectorized))
+            f.write(LOG_COUNT.pack(len(runs)))
+            for mask, count in runs:
+                f.write(LOG_RUN.pack(mask, count))
+            f.write(LOG_COUNT.pack(len(self.scores)))
+            for score in self.scores:
+                f.write(LOG_COUNT.pack(score))
+
+    @classmethod
+    def load(cls, file):
+        with open(file, 'rb') as f:
+            data = f.read()
+        magic, version, seed, dt, width, height, vectorized = \
+            LOG_HEADER.unpack_from(data)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError("{} is not a version {} session log".format(
+                file, LOG_VERSION))
+        offset = LOG_HEADER.size
+        masks = bytearray()
+        runs, = LOG_COUNT.unpack_from(data, offset)
+        offset += LOG_COUNT.size
+        for run in range(runs):
+            mask, count = LOG_RUN.unpack_from(data, offset)
+            offset += LOG_RUN.size
+            masks += bytes((mask,)) * count
+        scores = []
+        count, = LOG_COUNT.unpack_from(data, offset)
+        offset += LOG_COUNT.size
+        for game in range(count):
+            scores.append(LOG_COUNT.unpack_from(data, offset)[0])
+            offset += LOG_COUNT.size
+        return cls(seed, dt, (width, height), bool(vectorized), masks, scores)
+
 class Ship(pg.sprite.Sprite):
     """Load Ship class."""
 
@@ -67,54 +1098,75 @@ class Ship(pg.sprite.Sprite):
         pg.sprite.Sprite.__init__(self, self.groups)
         self.game = game
         self.angle = 0
-        self.image = self.game.one_ship
+        self.base_image = self.game.one_ship
+        self.image = self.base_image
         self.rect = self.image.get_rect()
-        self.pos = (x, y)
+        self.pos = vec(x, y)
+        self.prev_pos = vec(self.pos)
         self.rect.center = self.pos
         self.rot = 0
         self.rot_speed = 0
         self.vel = vec(0, 0)
         self.dt = dt
+        self.input = None
         self.energy = self.game.energy
         self.shoot_delay = 500
-        self.last_shot = pg.time.get_ticks()
+        self.last_shot = self.game.get_ticks()
 
     def update(self):
         if self.energy > 50:
             self.shoot_delay = 250
+        self.prev_pos = vec(self.pos)
         self.rot = (self.rot + self.rot_speed * self.dt) % 360
-        self.image = pg.transform.rotate(self.image, self.rot)
-        self.rect = self.image.get_rect()
+        self.image, rect = self.game.ship_frames.get(
+            self.base_image, None, self.rot)
+        self.rect = rect.copy()
         self.pos += self.vel * self.dt
-        self.rect.center = int(self.pos.x), int(self.pos.y)
+        self.place(self.pos)
+
+    @property
+    def mask(self):
+        return self.game.ship_frames.mask(self.base_image, None, self.rot)
+
+    def place(self, pos):
+        self.rect.center = int(pos.x), int(pos.y)
         """Wrap ship round screen."""
         self.rect.centerx %= self.game.WIDTH
         self.rect.centery %= self.game.HEIGHT
 
     def get_keys(self):
-        self.image = self.game.one_ship
+        self.base_image = self.game.one_ship
         self.rot_speed = 0
         self.vel = vec(0, 0)
-        keys = pg.key.get_pressed()
+        if self.input is not None:
+            keys = self.input.get_pressed()
+        else:
+            keys = self.game.get_pressed()
+        if not self.alive():
+            """A destroyed ship ignores the keys until the next game."""
+            return
         if keys[pg.K_LEFT]:
             self.rot_speed = SHIP_ROT_SPEED
         if keys[pg.K_RIGHT]:
             self.rot_speed = -SHIP_ROT_SPEED
         if keys[pg.K_UP]:
-            self.image = self.game.two_ship
+            self.base_image = self.game.two_ship
             self.vel = vec(SHIP_VEL, 0).rotate(-self.rot)
         if keys[pg.K_SPACE]:
             self.shoot()
 
     def shoot(self):
-        now = pg.time.get_ticks()
+        now = self.game.get_ticks()
         if now - self.last_shot > self.shoot_delay:
             self.last_shot = now
             direction = vec(1, 0).rotate(-self.rot)
             pos = self.rect.center + WEAPON_OFFSET.rotate(-self.rot)
             rot = self.rot
-            Bullet(gm, pos, direction, rot, self.dt)
-            self.game.fire_sound.play()
+            if self.game.engine is not None:
+                self.game.engine.add_bullet(pos, direction, rot)
+            else:
+                self.game.bullet_pool.acquire(pos, direction, rot, self.dt)
+            self.game.audio.play('fire')
             self.energy -= 0.5
             if self.energy <= 0:
                 self.game.playing = False
@@ -122,62 +1174,102 @@ class Ship(pg.sprite.Sprite):
 class Bullet(pg.sprite.Sprite):
     """Load Bullet class."""
 
-    def __init__(self, game, pos, direction, rot, dt):
-        self.groups = game.all_sprites, game.bullets
+    def __init__(self, game, pos=None, direction=None, rot=0, dt=None):
         self._layer = BULLET_LAYER
         self.game = game
-        pg.sprite.Sprite.__init__(self, self.groups)
-        self.image = self.game.bullet
+        self.pool = None
+        pg.sprite.Sprite.__init__(self)
+        if pos is not None:
+            self.reset(pos, direction, rot, dt)
+
+    def reset(self, pos, direction, rot, dt):
+        """Fire the bullet from pos, adding it to the game's groups."""
+        self.add(self.game.all_sprites, self.game.bullets)
         self.dt = dt
         self.rot = rot
-        self.image = pg.transform.rotate(self.image, self.rot)
-        self.rect = self.image.get_rect()
+        self.image, rect = self.game.rot_cache.get(
+            self.game.bullet, None, self.rot)
+        self.rect = rect.copy()
         self.pos = vec(pos)
+        self.prev_pos = vec(self.pos)
         self.rect.center = int(self.pos.x), int(self.pos.y)
         self.vel = direction * (SHIP_VEL + BULLET_VEL)
 
+    def kill(self):
+        if self.pool is not None and self.alive():
+            self.pool.release(self)
+        pg.sprite.Sprite.kill(self)
+
     def update(self):
+        self.prev_pos = vec(self.pos)
         self.pos += self.vel * self.dt
-        self.rect.center = int(self.pos.x), int(self.pos.y)
+        self.place(self.pos)
         """kill it if it moves off the screen"""
         if (self.rect.centerx > self.game.WIDTH or self.rect.centerx < 0
                 or self.rect.centery > self.game.HEIGHT
                 or self.rect.centery < 0):
             self.kill()
 
+    @property
+    def mask(self):
+        return self.game.rot_cache.mask(self.game.bullet, None, self.rot)
+
+    def place(self, pos):
+        self.rect.center = int(pos.x), int(pos.y)
+
 class Rocks(pg.sprite.Sprite):
-    """Load Rocks class."""
+    """Load Rocks class.
 
-    def __init__(self, game, dt):
+    size indexes ROCK_SIZES, largest first. A new rock is large and comes
+    in from the right hand edge; a fragment is given its size, image
+    index, position and velocity.
+    """
+
+    def __init__(self, game, dt, size=0, pos=None, vel=None, image=None):
         self.groups = game.all_sprites, game.rocks
         self._layer = ROCK_LAYER
         pg.sprite.Sprite.__init__(self, self.groups)
         self.game = game
-        self.image_orig = random.choice(game.asteroid_images)
-        self.image_index = game.asteroid_images.index(self.image_orig)
-        self.image_orig.set_colorkey(BLACK)
-        self.image = self.image_orig.copy()
-        self.image = pg.transform.scale(self.image, (60, 60))
-        self.rect = self.image.get_rect()
-        self.angle = random.randrange(-3, 6)
-        self.ast_rot_angle = random.randrange(-3, 3)
+        if image is None:
+            image = game.rng.randrange(len(game.asteroid_images))
+        self.image_index = image
+        self.image_orig = game.asteroid_images[image]
+        self.angle = game.rng.randrange(-3, 6)
+        self.ast_rot_angle = game.rng.randrange(-3, 3)
         self.dt = dt
-        self.dir = vec(random.randrange(-10, -3), random.randrange(1, 5))
-        self.rect = self.image.get_rect()
-        self.pos = vec(self.game.WIDTH, random.randrange(1, 500))
+        if vel is None:
+            self.dir = vec(game.rng.randrange(-10, -3),
+                           game.rng.randrange(1, 5))
+            vel = self.dir * ROCK_VEL
+        self.size = size
+        self.frame_size = ROCK_SIZES[size]
+        self.image, rect = game.rot_cache.get(
+            self.image_orig, self.frame_size, self.angle)
+        self.rect = rect.copy()
+        if pos is None:
+            pos = (self.game.WIDTH, game.rng.randrange(1, 500))
+        self.pos = vec(pos)
+        self.prev_pos = vec(self.pos)
         self.rect.center = int(self.pos.x), int(self.pos.y)
-        self.vel = self.dir * ROCK_VEL
-        self.size = self.image_index % 2
+        self.vel = vec(vel)
 
     def update(self):
+        self.prev_pos = vec(self.pos)
         self.angle += self.ast_rot_angle
         self.angle = self.angle % 360
-        self.image = self.image_orig.copy()
-        self.image = pg.transform.scale(self.image, (60, 60))
-        self.image = pg.transform.rotate(self.image, self.angle)
-        self.rect = self.image.get_rect()
+        self.image, rect = self.game.rot_cache.get(
+            self.image_orig, self.frame_size, self.angle)
+        self.rect = rect.copy()
         self.pos += self.vel * self.dt
-        self.rect.center = int(self.pos.x), int(self.pos.y)
+        self.place(self.pos)
+
+    @property
+    def mask(self):
+        return self.game.rot_cache.mask(
+            self.image_orig, self.frame_size, self.angle)
+
+    def place(self, pos):
+        self.rect.center = int(pos.x), int(pos.y)
         """Wrap rocks round screen"""
         self.rect.x %= self.game.WIDTH
         self.rect.y %= self.game.HEIGHT
@@ -191,55 +1283,72 @@ class Ball(pg.sprite.Sprite):
         pg.sprite.Sprite.__init__(self, self.groups)
         self.game = game
         self.image_orig = game.g_ball
-        self.image_orig.set_colorkey(BLACK)
-        self.image = self.image_orig.copy()
-        self.image = pg.transform.scale(self.image, (60, 60))
-        self.rect = self.image.get_rect()
-        self.angle = random.randrange(-3, 6)
-        self.ast_rot_angle = random.randrange(-3, 3)
+        self.angle = game.rng.randrange(-3, 6)
+        self.ast_rot_angle = game.rng.randrange(-3, 3)
         self.dt = dt
-        self.dir = vec(random.randrange(-10, -3), random.randrange(1, 5))
-        self.rect = self.image.get_rect()
-        self.pos = vec(int(self.game.WIDTH), int(random.randrange(1, 500)))
+        self.dir = vec(game.rng.randrange(-10, -3), game.rng.randrange(1, 5))
+        self.image, rect = game.rot_cache.get(
+            self.image_orig, BALL_SIZE, self.angle)
+        self.rect = rect.copy()
+        self.pos = vec(int(self.game.WIDTH), int(game.rng.randrange(1, 500)))
+        self.prev_pos = vec(self.pos)
         self.rect.center = self.pos
         self.vel = self.dir * ROCK_VEL
 
     def update(self):
+        self.prev_pos = vec(self.pos)
         self.angle += self.ast_rot_angle
         self.angle = self.angle % 360
-        self.image = self.image_orig.copy()
-        self.image = pg.transform.scale(self.image, (40, 40))
-        self.image = pg.transform.rotate(self.image, self.angle)
-        self.rect = self.image.get_rect()
+        self.image, rect = self.game.rot_cache.get(
+            self.image_orig, BALL_SIZE, self.angle)
+        self.rect = rect.copy()
         self.pos += self.vel * self.dt
-        self.rect.center = self.pos
+        self.place(self.pos)
         if (self.rect.centerx > self.game.WIDTH or self.rect.centerx < 0
                 or self.rect.centery > self.game.HEIGHT
                 or self.rect.centery < 0):
             self.kill()
 
+    @property
+    def mask(self):
+        return self.game.rot_cache.mask(self.image_orig, BALL_SIZE, self.angle)
+
+    def place(self, pos):
+        self.rect.center = pos
+
 class Explosion(pg.sprite.Sprite):
     """Load Explosion class."""
 
-    def __init__(self, game, center, size):
-        self.groups = game.all_sprites, game.explosions
+    def __init__(self, game, center=None, size=0):
         self._layer = EXPLOSION_LAYER
-        pg.sprite.Sprite.__init__(self, self.groups)
         self.game = game
+        self.pool = None
+        pg.sprite.Sprite.__init__(self)
+        if center is not None:
+            self.reset(center, size)
+
+    def reset(self, center, size):
+        """Start the animation at center, adding it to the game's groups."""
+        self.add(self.game.all_sprites, self.game.explosions)
         self.size = size
         self.frame = 0
-        self.frame_rate = 20
-        self.image = game.explosion_anim[self.size][self.frame]
+        self.frame_rate = EXPLOSION_FRAME_MS
+        self.image = self.game.explosion_anim[self.size][self.frame]
         self.rect = self.image.get_rect()
         self.rect.center = center
-        self.last_update = pg.time.get_ticks()
+        self.last_update = self.game.get_ticks()
+
+    def kill(self):
+        if self.pool is not None and self.alive():
+            self.pool.release(self)
+        pg.sprite.Sprite.kill(self)
 
     def update(self):
-        now = pg.time.get_ticks()
+        now = self.game.get_ticks()
         if now - self.last_update > self.frame_rate:
             self.last_update = now
-            self.frame += 1
-            if self.frame == len(self.game.explosion_anim[self.size]):
+            self.frame += self.game.explosion_skip
+            if self.frame >= len(self.game.explosion_anim[self.size]):
                 self.kill()
             else:
                 center = self.rect.center
@@ -247,33 +1356,544 @@ class Explosion(pg.sprite.Sprite):
                 self.rect = self.image.get_rect()
                 self.rect.center = center
 
+class EntityArrays:
+    """Struct-of-arrays store for one kind of moving entity.
+
+    Each entity is a slot index into the pos, prev, vel, angle, spin,
+    size, image, tier and alive arrays. prev holds pos as it was before
+    the last tick, for drawing between ticks, and tier indexes
+    ROCK_SIZES. Dead slots are reused before new ones are taken and the
+    arrays double in size when they fill up. Entities given a wrap
+    (width, height) wrap round the screen the way Rocks.place() does it:
+    the top left of their box is wrapped and the centre follows from it.
+    """
+
+    fields = ('pos', 'prev', 'vel', 'angle', 'spin', 'size', 'image', 'tier',
+              'alive')
+
+    def __init__(self, capacity=ENTITY_CAPACITY, wrap=None):
+        self.count = 0
+        self.free = []
+        self.wrap = None if wrap is None else np.array(wrap)
+        self.pos = np.zeros((capacity, 2))
+        self.prev = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.angle = np.zeros(capacity)
+        self.spin = np.zeros(capacity)
+        self.size = np.zeros((capacity, 2))
+        self.image = np.zeros(capacity, dtype=np.intp)
+        self.tier = np.zeros(capacity, dtype=np.intp)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    def grow(self):
+        """Double the capacity of every array."""
+        for name in self.fields:
+            old = getattr(self, name)
+            new = np.zeros((len(old) * 2,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, pos, vel, angle=0, spin=0, size=(0, 0), image=0, tier=0):
+        """Store a new entity and return its slot."""
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.count == len(self.alive):
+                self.grow()
+            index = self.count
+            self.count += 1
+        self.pos[index] = pos
+        self.prev[index] = pos
+        self.vel[index] = vel
+        self.angle[index] = angle
+        self.spin[index] = spin
+        self.size[index] = size
+        self.image[index] = image
+        self.tier[index] = tier
+        self.alive[index] = True
+        return index
+
+    def live(self):
+        """Return the slots of the living entities in slot order."""
+        return np.flatnonzero(self.alive[:self.count])
+
+    def kill(self, indices):
+        """Free the given living slots."""
+        self.alive[indices] = False
+        self.free.extend(np.asarray(indices).tolist())
+
+    def centers(self, indices):
+        """Return the integer rect centres of the given slots."""
+        return self.place(self.pos[indices].astype(int), indices)
+
+    def place(self, centers, indices):
+        """Wrap integer centres of the given slots by their top left."""
+        if self.wrap is None:
+            return centers
+        half = self.size[indices].astype(int) // 2
+        return (centers - half) % self.wrap + half
+
+    def lerp(self, indices, alpha):
+        """Return integer centres alpha of the way from prev to pos.
+
+        Wrapping entities take the short way round rather than sliding
+        back across the screen.
+        """
+        prev = self.prev[indices]
+        step = self.pos[indices] - prev
+        if self.wrap is None:
+            return (prev + step * alpha).astype(int)
+        step -= self.wrap * np.round(step / self.wrap)
+        return self.place(
+            ((prev + step * alpha) % self.wrap).astype(int), indices)
+
+class EntityEngine:
+    """NumPy backend that replaces the Bullet and Rocks sprites.
+
+    Movement, the rock wrap, the off-screen bullet kill and the bounding
+    box collision checks each run as one array operation per tick, and
+    drawing is one Surface.blits() call. Only the pairs whose boxes meet
+    have their cached masks compared; the boxes are grown by BOX_SLACK
+    pixels as the stored sizes only estimate the rotated frames. Rocks are
+    drawn and collide at the same wrapped place, as Rocks sprites do.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.rocks = EntityArrays(wrap=(game.WIDTH, game.HEIGHT))
+        self.bullets = EntityArrays()
+        self.rock_sizes = np.array(ROCK_SIZES, dtype=float)
+        self.rects = []
+
+    def add_rock(self, size=0, pos=None, vel=None, image=None):
+        """Spawn a rock the way Rocks does."""
+        game = self.game
+        if image is None:
+            image = game.rng.randrange(len(game.asteroid_images))
+        angle = game.rng.randrange(-3, 6)
+        spin = game.rng.randrange(-3, 3)
+        if vel is None:
+            direction = (game.rng.randrange(-10, -3),
+                         game.rng.randrange(1, 5))
+            vel = (direction[0] * ROCK_VEL, direction[1] * ROCK_VEL)
+        if pos is None:
+            pos = (game.WIDTH, game.rng.randrange(1, 500))
+        self.rocks.add(pos, vel, angle % 360, spin, ROCK_SIZES[size], image,
+                       size)
+
+    def add_bullet(self, pos, direction, rot):
+        """Spawn a bullet the way Bullet does."""
+        image, rect = self.game.rot_cache.get(self.game.bullet, None, rot)
+        vel = direction * (SHIP_VEL + BULLET_VEL)
+        self.bullets.add(pos, vel, rot, 0, rect.size)
+
+    def update(self):
+        """Move every rock and bullet one tick."""
+        game = self.game
+        bounds = np.array((game.WIDTH, game.HEIGHT))
+        rocks = self.rocks
+        live = rocks.live()
+        if len(live):
+            rocks.prev[live] = rocks.pos[live]
+            rocks.angle[live] = (rocks.angle[live] + rocks.spin[live]) % 360
+            rocks.pos[live] = (rocks.pos[live]
+                               + rocks.vel[live] * game.dt) % bounds
+            radians = np.radians(rocks.angle[live])
+            extent = np.abs(np.cos(radians)) + np.abs(np.sin(radians))
+            rocks.size[live] = (extent[:, None]
+                                * self.rock_sizes[rocks.tier[live]])
+        bullets = self.bullets
+        live = bullets.live()
+        if len(live):
+            bullets.prev[live] = bullets.pos[live]
+            bullets.pos[live] += bullets.vel[live] * game.dt
+            center = bullets.centers(live)
+            gone = ((center < 0) | (center > bounds)).any(1)
+            bullets.kill(live[gone])
+
+    def frames(self, arrays, slots):
+        """Return the mask and top left of each slot's current frame."""
+        game = self.game
+        if arrays is self.rocks:
+            images = [game.asteroid_images[image]
+                      for image in arrays.image[slots].tolist()]
+            sizes = [ROCK_SIZES[tier] for tier in arrays.tier[slots].tolist()]
+        else:
+            images = [game.bullet] * len(slots)
+            sizes = [None] * len(slots)
+        frames = []
+        for image, size, (x, y), angle in zip(
+                images, sizes, arrays.centers(slots).tolist(),
+                arrays.angle[slots].tolist()):
+            mask = game.rot_cache.mask(image, size, angle)
+            width, height = mask.get_size()
+            frames.append((mask, (x - width // 2, y - height // 2)))
+        return frames
+
+    def collide_sprite(self, arrays, sprite):
+        """Return the living slots of arrays whose frames touch sprite."""
+        live = arrays.live()
+        if not len(live):
+            return live
+        rect = sprite.rect
+        gap = np.abs(arrays.centers(live) - rect.center)
+        reach = (arrays.size[live] + rect.size) / 2 + BOX_SLACK
+        near = live[(gap < reach).all(1)]
+        if not len(near):
+            return near
+        mask = sprite.mask
+        touching = [mask.overlap(other, (x - rect.x, y - rect.y)) is not None
+                    for other, (x, y) in self.frames(arrays, near)]
+        return near[np.array(touching, dtype=bool)]
+
+    def collide_ship(self, ship):
+        """Kill rocks that touch the ship, return how many."""
+        hits = self.collide_sprite(self.rocks, ship)
+        self.rocks.kill(hits)
+        return len(hits)
+
+    def pairs(self, centers_a, centers_b, reach):
+        """Return index arrays of the (a, b) pairs within reach on a grid.
+
+        b is sorted by cell once, then every a looks up the runs of b in
+        its own and the eight neighbouring cells, so the work grows with
+        the number of nearby pairs rather than with len(a) * len(b).
+        """
+        cell = max(reach, 1.0)
+        rows = int(self.game.HEIGHT // cell) + 3
+        cells_a = np.floor_divide(centers_a, cell).astype(np.intp) + 1
+        cells_b = np.floor_divide(centers_b, cell).astype(np.intp) + 1
+        keys_b = cells_b[:, 0] * rows + cells_b[:, 1]
+        order = np.argsort(keys_b, kind='stable')
+        keys_b = keys_b[order]
+        found_a = []
+        found_b = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = (cells_a[:, 0] + dx) * rows + cells_a[:, 1] + dy
+                low = np.searchsorted(keys_b, keys, 'left')
+                runs = np.searchsorted(keys_b, keys, 'right') - low
+                total = runs.sum()
+                if not total:
+                    continue
+                found_a.append(np.repeat(np.arange(len(keys)), runs))
+                offset = np.repeat(low - np.cumsum(runs) + runs, runs)
+                found_b.append(order[np.arange(total) + offset])
+        if not found_a:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+        return np.concatenate(found_a), np.concatenate(found_b)
+
+    def collide_bullets(self):
+        """Kill rocks and the bullets that touch them.
+
+        As with groupcollide, every bullet is used up by the first rock in
+        slot order that it touches. Returns the centre, velocity, size and
+        image index of every rock hit.
+        """
+        rocks = self.rocks.live()
+        bullets = self.bullets.live()
+        if not len(rocks) or not len(bullets):
+            return []
+        rock_centers = self.rocks.centers(rocks)
+        rock_sizes = self.rocks.size[rocks]
+        bullet_centers = self.bullets.centers(bullets)
+        bullet_sizes = self.bullets.size[bullets]
+        near_rock, near_bullet = self.pairs(
+            rock_centers, bullet_centers,
+            (rock_sizes.max() + bullet_sizes.max()) / 2 + BOX_SLACK)
+        gap = np.abs(rock_centers[near_rock] - bullet_centers[near_bullet])
+        reach = ((rock_sizes[near_rock] + bullet_sizes[near_bullet]) / 2
+                 + BOX_SLACK)
+        boxed = (gap < reach).all(1)
+        near_rock = near_rock[boxed]
+        near_bullet = near_bullet[boxed]
+        if not len(near_rock):
+            return []
+        ids = np.unique(near_rock)
+        rock_frames = dict(zip(ids.tolist(),
+                               self.frames(self.rocks, rocks[ids])))
+        ids = np.unique(near_bullet)
+        bullet_frames = dict(zip(ids.tolist(),
+                                 self.frames(self.bullets, bullets[ids])))
+        touching = []
+        for rock, bullet in zip(near_rock.tolist(), near_bullet.tolist()):
+            mask, (x, y) = rock_frames[rock]
+            other, (ox, oy) = bullet_frames[bullet]
+            touching.append(mask.overlap(other, (ox - x, oy - y)) is not None)
+        touching = np.array(touching, dtype=bool)
+        near_rock = near_rock[touching]
+        near_bullet = near_bullet[touching]
+        order = np.lexsort((near_rock, near_bullet))
+        near_rock = near_rock[order]
+        near_bullet = near_bullet[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = near_bullet[1:] != near_bullet[:-1]
+        hit = np.unique(near_rock[first])
+        self.bullets.kill(bullets[np.unique(near_bullet)])
+        slots = rocks[hit]
+        hits = list(zip(rock_centers[hit].tolist(),
+                        self.rocks.vel[slots].tolist(),
+                        self.rocks.tier[slots].tolist(),
+                        self.rocks.image[slots].tolist()))
+        self.rocks.kill(slots)
+        return hits
+
+    def collide_group(self, group):
+        """Kill the sprites in group hit by a bullet and those bullets."""
+        hits = []
+        for sprite in group.sprites():
+            touching = self.collide_sprite(self.bullets, sprite)
+            if len(touching):
+                self.bullets.kill(touching)
+                hits.append(sprite)
+        for sprite in hits:
+            sprite.kill()
+        return hits
+
+    def draw(self, surface, alpha=1.0):
+        """Blit every rock and bullet in one call, returning their rects.
+
+        Entities are drawn alpha of the way through the last tick.
+        """
+        game = self.game
+        cache = game.rot_cache
+        images = game.asteroid_images
+        blits = []
+        rocks = self.rocks
+        live = rocks.live()
+        for (x, y), image, tier, angle in zip(
+                rocks.lerp(live, alpha).tolist(),
+                rocks.image[live].tolist(), rocks.tier[live].tolist(),
+                rocks.angle[live].tolist()):
+            frame, rect = cache.get(images[image], ROCK_SIZES[tier], angle)
+            blits.append((frame, (x - rect.width // 2, y - rect.height // 2)))
+        bullets = self.bullets
+        live = bullets.live()
+        for (x, y), angle in zip(bullets.lerp(live, alpha).tolist(),
+                                 bullets.angle[live].tolist()):
+            frame, rect = cache.get(game.bullet, None, angle)
+            blits.append((frame, (x - rect.width // 2, y - rect.height // 2)))
+        self.rects = surface.blits(blits)
+        return self.rects
+
+class ParticleSystem:
+    """Packed NumPy pool of short-lived debris particles.
+
+    The live particles are always the first ``count`` rows of the pos,
+    vel and life arrays, so update() moves and ages them all with a few
+    array operations and drops the dead ones by packing the rest down.
+    emit() adds a burst and drops whatever does not fit in capacity.
+    draw() writes a PARTICLE_SIZE square per particle straight into the
+    surface's pixels, the colour fading through PARTICLE_COLORS as the
+    particle ages, which is far quicker than blitting thousands of dots.
+    """
+
+    def __init__(self, game, capacity=PARTICLE_CAPACITY):
+        self.game = game
+        self.seed(game.rng.getrandbits(32))
+        self.capacity = capacity
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.life = np.zeros(capacity)
+        self.scale = 1.0
+        self.dropped = 0
+        self.offsets = [(x - PARTICLE_SIZE // 2, y - PARTICLE_SIZE // 2)
+                        for x in range(PARTICLE_SIZE)
+                        for y in range(PARTICLE_SIZE)]
+        self.rects = []
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def seed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def emit(self, center, number, speed=PARTICLE_SPEED):
+        """Throw number particles, times scale, out from center."""
+        number = int(number * self.scale)
+        free = self.capacity - self.count
+        if number > free:
+            self.dropped += number - free
+            number = free
+        if number <= 0:
+            return
+        start = self.count
+        end = self.count = start + number
+        angle = self.rng.uniform(0, 2 * math.pi, number)
+        speed = self.rng.uniform(0.2, 1.0, number) * speed
+        self.pos[start:end] = center
+        self.vel[start:end, 0] = np.cos(angle) * speed
+        self.vel[start:end, 1] = np.sin(angle) * speed
+        self.life[start:end] = self.rng.uniform(0.5, 1.0, number) * \
+            PARTICLE_LIFE
+
+    def update(self):
+        """Move, slow and age every particle one tick."""
+        count = self.count
+        if not count:
+            return
+        self.pos[:count] += self.vel[:count] * self.game.dt
+        self.vel[:count] *= PARTICLE_DRAG
+        self.life[:count] -= STEP_MS
+        alive = self.life[:count] > 0
+        kept = int(alive.sum())
+        if kept < count:
+            for array in (self.pos, self.vel, self.life):
+                array[:kept] = array[:count][alive]
+            self.count = kept
+
+    def draw(self, surface, alpha=1.0):
+        """Draw every particle alpha of the way through the last tick.
+
+        Returns the rect bounding them all.
+        """
+        count = self.count
+        if not count:
+            self.rects = []
+            return self.rects
+        pos = (self.pos[:count] - self.vel[:count] * (
+            self.game.dt * (1 - alpha))).astype(np.intp)
+        shades = len(PARTICLE_COLORS)
+        shade = np.minimum(
+            ((1 - self.life[:count] / PARTICLE_LIFE) * shades).astype(np.intp),
+            shades - 1)
+        try:
+            pixels = pg.surfarray.pixels2d(surface)
+            colors = np.array([surface.map_rgb(color)
+                               for color in PARTICLE_COLORS])
+        except ValueError:
+            """24 bit surfaces have no 2d view."""
+            pixels = pg.surfarray.pixels3d(surface)
+            colors = np.array(PARTICLE_COLORS, dtype=np.uint8)
+        colors = colors[shade]
+        width, height = surface.get_size()
+        for dx, dy in self.offsets:
+            x = pos[:, 0] + dx
+            y = pos[:, 1] + dy
+            inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            pixels[x[inside], y[inside]] = colors[inside]
+        del pixels
+        low = pos.min(0) - PARTICLE_SIZE
+        high = pos.max(0) + PARTICLE_SIZE
+        self.rects = [pg.Rect(low.tolist(), (high - low).tolist()).clip(
+            surface.get_rect())]
+        return self.rects
+
 class Game:
     """Load Game class."""
 
-    def __init__(self):
+    def __init__(self, headless=False, input_source=None, vectorized=False,
+                 profile_out=None, seed=None, size=None, render_fps=FPS,
+                 adaptive_quality=None):
         """Get screen size and intilise sound settings and pygame.
            Initialise start variables.
+
+           The game clock is simulated and advances STEP_MS per update, so
+           gameplay runs at FPS steps a second whatever render_fps the
+           screen is drawn at.
+           A headless game uses the SDL dummy video and audio drivers and
+           a HEADLESS_SIZE window. Otherwise the game is drawn at the
+           display size scaled down to fit LOGICAL_SIZE and pg.SCALED
+           stretches it over the whole screen. input_source, if given,
+           replaces the keyboard and must provide get_pressed(). A
+           vectorized game keeps bullets and rocks in an EntityEngine,
+           which needs numpy. profile_out names a file to stream per-frame
+           timings to. Giving a seed makes the game deterministic as the
+           random numbers come from it. size overrides the screen size.
+           adaptive_quality lets a QualityGovernor lower the drawing
+           quality to keep up with render_fps; by default it does so unless
+           the game is headless, scripted or seeded, as coarser rock frames
+           change the collision rects and so would break replays.
         """
+        if vectorized and np is None:
+            raise ImportError("numpy is required for the vectorized engine")
+        self.headless = headless
+        self.vectorized = vectorized
+        self.engine = None
+        self.input = input_source
+        self.crew = []
+        self.ticks = 0
+        self.render_fps = render_fps
+        self.rng = random.Random(seed)
+        self.scores = deque(maxlen=SCORE_HISTORY)
+        self.frames_played = 0
+        if headless:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
         pg.mixer.pre_init(44100, -16, 8, 1024)
         pg.init()
+        pg.mixer.set_num_channels(MIXER_CHANNELS)
         pg.mouse.set_visible(False)
-        infoObject = pg.display.Info()
-        self.WIDTH = int(infoObject.current_w)
-        self.HEIGHT = int(infoObject.current_h)
+        if size is not None:
+            self.WIDTH, self.HEIGHT = size
+        elif headless:
+            self.WIDTH, self.HEIGHT = HEADLESS_SIZE
+        else:
+            infoObject = pg.display.Info()
+            self.WIDTH, self.HEIGHT = logical_size(
+                infoObject.current_w, infoObject.current_h)
         self.font_name = pg.font.match_font(FONT_NAME)
+        self.text_renderer = TextRenderer(self.font_name)
         self.clock = pg.time.Clock()
-        self.dt = self.clock.tick(FPS) / 100.0
+        self.dt = SIM_DT
         self.screentime = 0
         self.wtime = int(self.screentime / 20 % self.WIDTH)
         self.running = True
-        self.screen = pg.display.set_mode(
-            (self.WIDTH, self.HEIGHT), pg.FULLSCREEN)
+        if headless:
+            self.screen = pg.display.set_mode((self.WIDTH, self.HEIGHT))
+        else:
+            self.screen = pg.display.set_mode(
+                (self.WIDTH, self.HEIGHT), pg.FULLSCREEN | pg.SCALED)
         pg.display.set_caption("Asteroids")
+        self.loader = AssetLoader()
+        self.music = MusicPlayer()
+        self.audio = VoiceManager()
         self.playing = None
+        self.dirty_rects = DIRTY_RECTS
+        self.ast_range = AST_RANGE
+        self.profiler = FrameProfiler(out=profile_out)
+        self.capture = None
+        if adaptive_quality is None:
+            adaptive_quality = (not headless and input_source is None
+                                and seed is None)
+        self.governor = QualityGovernor(1000 / render_fps,
+                                        enabled=adaptive_quality)
+        self.explosion_skip = 1
+        self.explosion_cap = None
+        self.show_profile = False
+        self.profile_panel = None
+        self.grid = SpatialHash()
+        self.all_sprites = pg.sprite.LayeredUpdates()
+        self.bullets = pg.sprite.Group()
+        self.rocks = pg.sprite.Group()
+        self.explosions = pg.sprite.Group()
+        self.ball = pg.sprite.Group()
+        self.ship = None
+        self.ships = []
+        self.asteroid_list = ['asteroid-1.png',
+                              'asteroid-2.png',
+                              'asteroid-3.png',
+                              'asteroid-4.png',
+                              'asteroid-5.png',
+                              'asteroid-6.png',
+                              'asteroid-7.png']
         self.load_images()
+        self.bullet_pool = SpritePool(lambda: Bullet(self), BULLET_POOL_SIZE)
+        self.explosion_pool = SpritePool(
+            lambda: Explosion(self), EXPLOSION_POOL_SIZE)
+        self.particles = ParticleSystem(self) if np is not None else None
+        self.apply_quality()
 
     def load_images(self):
-        """Load all game graphics."""
+        """Load all game graphics, from the baked atlas if it is current."""
         folder = path.join(path.dirname(__file__), 'img')
         try:
             self.dir = path.dirname(__file__)
@@ -283,71 +1903,192 @@ class Game:
             except IOError:
                 print("No file highscore.txt found")
                 self.highscore = 0
-            self.stars = pg.image.load(os.path.join(
-                folder, 'stars.png')).convert()
-            self.debris = pg.image.load(os.path.join(
-                folder, 'debris.png')).convert_alpha()
-            self.one_ship = pg.image.load(os.path.join(
-                folder, 'one_ship.png')).convert()#
-            self.one_ship.set_colorkey(BLACK)  # black is transparent
-            self.two_ship = pg.image.load(os.path.join(
-                folder, 'two_ship.png')).convert()
-            self.two_ship.set_colorkey(BLACK)  # black is transparent
-            self.little_ship = pg.image.load(
-                os.path.join(folder, 'mini_one_ship.png')).convert()
-            self.little_ship.set_colorkey(BLACK)  # black is transparent
-            self.bullet = pg.image.load(os.path.join(
-                folder, 'laser_bullet.png')).convert()
-            self.bullet.set_colorkey(BLACK)  # black is transparent
-            self.g_ball = pg.image.load(
-                os.path.join(folder, 'Gold_ball.png')).convert()
-            self.g_ball.set_colorkey(BLACK)
-            self.asteroid_list = ['asteroid-1.png',
-                                  'asteroid-2.png',
-                                  'asteroid-3.png',
-                                  'asteroid-4.png',
-                                  'asteroid-5.png',
-                                  'asteroid-6.png',
-                                  'asteroid-7.png']
-            self.asteroid_images: str = []
-            for ast in self.asteroid_list:
-                self.asteroid_images.append(pg.image.load(
-                    os.path.join(folder, ast)).convert())
-            exp_frames = []
+            self.img_dir = folder
+            self.atlas = AssetAtlas(folder, path.join(self.dir, CACHE_DIR))
+            baked = self.loader.call(self.atlas.read)
+            self.show_splash([baked])
+            images = self.atlas.unpack(baked.result())
+            if images is None:
+                images = self.decode_images(folder)
+            self.backdrop = Backdrop(images['stars'], images['debris'],
+                                     self.screen.get_size())
+            self.one_ship = images['one_ship']
+            self.two_ship = images['two_ship']
+            self.little_ship = images['little_ship']
+            self.bullet = images['bullet']
+            self.g_ball = images['g_ball']
+            self.asteroid_images: str = [
+                images[ast] for ast in self.asteroid_list]
+            self.rot_cache = RotationCache()
+            self.ship_frames = RotationCache(SHIP_ROT_STEP, None)
+            self.ship_frames.prefill(self.one_ship)
+            self.ship_frames.prefill(self.two_ship)
             self.explosion_anim: str = {}
-            self.explosion_anim[0] = []
-            self.explosion_anim[1] = []
-            self.explosion_anim[2] = []
-            image = pg.image.load(
-                os.path.join(folder, 'explosion.png')).convert_alpha()
-            width, height = image.get_size()
-            w, h = 64, 64
-            for i in range(int(height / h)):
-                for j in range(int(width / w)):
-                    exp_frames.append(image.subsurface((j * w, i * h, w, h)))
-            for count in range(len(exp_frames)):
-                img_lg = pg.transform.scale(exp_frames[count], (75, 75))
-                self.explosion_anim[0].append(img_lg)
-                img_sm = pg.transform.scale(exp_frames[count], (40, 40))
-                self.explosion_anim[1].append(img_sm)
-                img_end = pg.transform.scale(exp_frames[count], (100, 100))
-                self.explosion_anim[2].append(img_end)
+            for size in range(len(EXPLOSION_SIZES)):
+                self.explosion_anim[size] = []
+                while 'explosion-{}-{}'.format(
+                        size, len(self.explosion_anim[size])) in images:
+                    self.explosion_anim[size].append(images[
+                        'explosion-{}-{}'.format(
+                            size, len(self.explosion_anim[size]))])
 
         except OSError as err:
             print("OS error: {0}".format(err))
         self.load_sounds()
 
+    def decode_images(self, folder):
+        """Decode the PNGs into converted surfaces at their play sizes.
+
+        The files are decoded on the loader's workers behind the splash
+        screen, then converted and scaled here.
+        """
+        colorkeyed = (('one_ship', 'one_ship.png'),
+                      ('two_ship', 'two_ship.png'),
+                      ('little_ship', 'mini_one_ship.png'),
+                      ('bullet', 'laser_bullet.png'),
+                      ('g_ball', 'Gold_ball.png'))
+        files = (['stars.png', 'debris.png', 'explosion.png']
+                 + [file for name, file in colorkeyed] + self.asteroid_list)
+        decoded = {file: self.loader.image(os.path.join(folder, file))
+                   for file in files}
+        self.show_splash(list(decoded.values()))
+        images = {}
+        images['stars'] = decoded['stars.png'].result().convert()
+        images['debris'] = decoded['debris.png'].result().convert_alpha()
+        for name, file in colorkeyed:
+            images[name] = decoded[file].result().convert()
+            images[name].set_colorkey(BLACK)  # black is transparent
+        for ast in self.asteroid_list:
+            asteroid = decoded[ast].result().convert()
+            asteroid.set_colorkey(BLACK)
+            images[ast] = pg.transform.scale(asteroid, ROCK_SIZE)
+        exp_frames = []
+        image = decoded['explosion.png'].result().convert_alpha()
+        width, height = image.get_size()
+        w, h = 64, 64
+        for i in range(int(height / h)):
+            for j in range(int(width / w)):
+                exp_frames.append(image.subsurface((j * w, i * h, w, h)))
+        for size, pixels in enumerate(EXPLOSION_SIZES):
+            for count in range(len(exp_frames)):
+                images['explosion-{}-{}'.format(size, count)] = \
+                    pg.transform.scale(exp_frames[count], (pixels, pixels))
+        return images
+
     def load_sounds(self):
-        """Load all sound files."""
+        """Load all sound files.
+
+        The music keeps decoding in the background after this returns.
+        """
         self.snd_dir = path.join(self.dir, 'snd')
-        self.fire_sound = pg.mixer.Sound(path.join(self.snd_dir, 'laser.ogg'))
+        fire = self.loader.sound(path.join(self.snd_dir, 'laser.ogg'))
+        explosion = self.loader.sound(path.join(self.snd_dir, 'rumble.ogg'))
+        self.music.add('start', self.loader.sound(
+            path.join(self.snd_dir, 'start.ogg')))
+        self.music.add('space', self.loader.sound(
+            path.join(self.snd_dir, 'space.ogg')))
+        self.show_splash([fire, explosion])
+        self.fire_sound = fire.result()
         self.fire_sound.set_volume(0.25)
-        self.explosion_sound = pg.mixer.Sound(
-            path.join(self.snd_dir, 'rumble.ogg'))
+        self.explosion_sound = explosion.result()
         self.explosion_sound.set_volume(0.25)
+        self.audio.add('fire', self.fire_sound, 'weapons', 4, 1)
+        self.audio.add('explosion', self.explosion_sound, 'explosions', 6, 2)
+
+    def show_splash(self, futures):
+        """Keep a loading screen going until every future is done."""
+        if self.headless:
+            for future in futures:
+                future.exception()
+            return
+        while not all(future.done() for future in futures):
+            pg.event.pump()
+            done = sum(future.done() for future in futures)
+            self.screen.fill(BLACK)
+            self.draw_text("Loading...", 22, WHITE,
+                           self.WIDTH // 2, self.HEIGHT // 2 - 40)
+            self.draw_energy_bar(self.screen, self.WIDTH // 2 - 100,
+                                 self.HEIGHT // 2, 100 * done / len(futures))
+            pg.display.flip()
+            self.clock.tick(FPS)
+
+    def apply_quality(self):
+        """Switch to the governor's current quality settings."""
+        (self.rot_cache.step, self.explosion_skip,
+         self.backdrop.show_debris, self.explosion_cap,
+         particle_scale) = self.governor.settings
+        if self.particles is not None:
+            self.particles.scale = particle_scale
+
+    def scatter(self, center, number):
+        """Throw debris particles out from center when numpy is about."""
+        if self.particles is not None:
+            self.particles.emit(center, number)
+
+    def fragment(self, center, vel, size, image):
+        """Break a rock of size at center into FRAGMENTS smaller ones.
+
+        Each fragment flies off along the rock's velocity turned by up to
+        FRAGMENT_SPREAD degrees either way. The smallest rocks just go.
+        """
+        if size + 1 >= len(ROCK_SIZES):
+            return
+        for number in range(FRAGMENTS):
+            spread = self.rng.randrange(-FRAGMENT_SPREAD, FRAGMENT_SPREAD + 1)
+            velocity = vec(vel).rotate(spread) * FRAGMENT_SPEEDUP
+            if self.engine is not None:
+                self.engine.add_rock(size + 1, center, velocity, image)
+            else:
+                Rocks(self, self.dt, size + 1, center, velocity, image)
+
+    def explode(self, center, size):
+        """Start an explosion unless the quality cap is reached."""
+        if (self.explosion_cap is not None
+                and len(self.explosions) >= self.explosion_cap):
+            return
+        self.explosion_pool.acquire(center, size)
+
+    def blast_ms(self, size):
+        """Game time an explosion of size takes to burn out."""
+        frames = -(-len(self.explosion_anim[size]) // self.explosion_skip)
+        return frames * STEP_MS * (EXPLOSION_FRAME_MS // STEP_MS + 1)
+
+    def get_ticks(self):
+        """Milliseconds of game time, STEP_MS per update."""
+        return self.ticks
+
+    def get_pressed(self):
+        """Key state from the scripted input source or the keyboard."""
+        if self.input is not None:
+            return self.input.get_pressed()
+        return pg.key.get_pressed()
 
     def new(self):
+        """Start a new game and run it."""
+        self.reset()
+        self.run()
+
+    def teardown(self):
+        """Take down the last game's entities.
+
+        Every sprite is killed, so pooled ones go back to their pools, and
+        the groups, ships, entity arrays, particles and collision grid are
+        emptied. Nothing from the game is left referenced until reset().
+        """
+        for sprite in self.all_sprites.sprites():
+            sprite.kill()
+        for group in (self.bullets, self.rocks, self.explosions, self.ball):
+            group.empty()
+        self.ship = None
+        self.ships = []
+        self.engine = None
+        self.grid.clear()
+        if self.particles is not None:
+            self.particles.clear()
+
+    def reset(self):
         """Initialise all groups."""
+        self.teardown()
         self.all_sprites = pg.sprite.LayeredUpdates()
         self.bullets = pg.sprite.Group()
         self.rocks = pg.sprite.Group()
@@ -359,19 +2100,126 @@ class Game:
         self.my_score = 0
         self.energy = 100
         self.rock_timer = 0
+        self.game_over_at = None
+        if self.particles is not None:
+            self.particles.seed(self.rng.getrandbits(32))
+        self.backdrop.key = None
+        self.hud_rects = []
+        if self.vectorized:
+            self.engine = EntityEngine(self)
         self.ship = Ship(self, self.WIDTH / 2, self.HEIGHT / 2, self.dt)
-        self.run()
+        self.ships = [self.ship]
+        for source in self.crew:
+            self.launch(source)
+        self.playing = True
+
+    def launch(self, source):
+        """Put a ship driven by source in the game, SHIP_SPACING along."""
+        ship = Ship(self, self.WIDTH / 2 + SHIP_SPACING * len(self.ships),
+                    self.HEIGHT / 2, self.dt)
+        ship.input = source
+        self.ships.append(ship)
+        return ship
+
+    def add_ship(self, source):
+        """Add a co-op ship driven by source, now and in every new game.
+
+        The players share the score and the lives; self.ship stays the
+        first ship, driven by the game's own input.
+        """
+        self.crew.append(source)
+        return self.launch(source)
 
     def run(self):
-        pg.mixer.music.load(path.join(self.snd_dir, 'space.ogg'))
-        pg.mixer.music.play(loops=-1)
-        pg.mixer.music.set_volume(0.6)
-        self.playing = True
+        """Game loop: fixed STEP_MS updates drawn at render_fps.
+
+        The real time since the last frame is added to lag and one update
+        is run for every STEP_MS of it. After MAX_STEPS the rest is
+        dropped, so a stall slows the game down instead of leaving it
+        stuck catching up. Each frame is drawn the remaining fraction of
+        a step on from the last update.
+        """
+        self.music.play('space', 0.6)
+        self.clock.tick(self.render_fps)
+        lag = 0.0
         while self.playing:
-            self.clock.tick(FPS)
+            lag += self.clock.tick(self.render_fps)
+            self.music.poll()
+            self.profiler.start()
             self.events()
+            self.profiler.lap('events')
+            steps = 0
+            while lag >= STEP_MS and self.playing:
+                self.update()
+                lag -= STEP_MS
+                steps += 1
+                if steps == MAX_STEPS:
+                    lag %= STEP_MS
+                    break
+            self.draw(lag / STEP_MS)
+            self.profiler.lap('draw')
+            capture = {} if self.capture is None else self.capture.metrics()
+            self.profiler.end(steps=steps, **self.entity_counts(),
+                              **self.audio.rates(), **self.governor.metrics(),
+                              **self.bullet_pool.stats('bullet_pool_'),
+                              **self.explosion_pool.stats('explosion_pool_'),
+                              **capture)
+            if self.governor.observe(self.profiler.frames[-1]['frame']):
+                self.apply_quality()
+        self.end_game()
+
+    def end_game(self):
+        """Log the final score of a game that got at least one update.
+
+        Only the last SCORE_HISTORY scores are kept.
+        """
+        if self.frames_played:
+            self.scores.append(self.my_score)
+            self.frames_played = 0
+
+    def entity_counts(self):
+        """Return how many of each kind of entity are alive."""
+        if self.engine is not None:
+            rocks = len(self.engine.rocks)
+            bullets = len(self.engine.bullets)
+        else:
+            rocks = len(self.rocks)
+            bullets = len(self.bullets)
+        return {'rock_count': rocks, 'bullet_count': bullets,
+                'explosion_count': len(self.explosions),
+                'particle_count': (0 if self.particles is None
+                                   else len(self.particles)),
+                'sprite_count': len(self.all_sprites)}
+
+    def simulate(self, frames, render=False, capped=False):
+        """Run frames updates uncapped, starting a new game on game over.
+
+        Nothing is drawn unless render is set. A capped run keeps to FPS
+        and handles events so it can be watched and quit. Returns the
+        number of frames and games, the seconds taken, the frames per
+        second and the final score of every game.
+        """
+        self.reset()
+        games = 1
+        start = time.perf_counter()
+        for frame in range(frames):
+            if capped:
+                self.clock.tick(FPS)
+                self.events()
+                if not self.running:
+                    break
             self.update()
-            self.draw()
+            if render:
+                self.draw()
+            if not self.playing:
+                self.end_game()
+                self.reset()
+                games += 1
+        self.end_game()
+        seconds = time.perf_counter() - start
+        return {'frames': frames, 'games': games, 'seconds': seconds,
+                'fps': frames / seconds if seconds else float('inf'),
+                'scores': list(self.scores)}
 
     def events(self):
         """Check for end event."""
@@ -381,81 +2229,244 @@ class Game:
                 if self.playing:
                     self.playing = False
                 self.running = False
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.show_profile = not self.show_profile
 
     def update(self):
         """Update main game loop."""
         self.screentime += 1
+        self.frames_played += 1
+        self.ticks += 1000 / FPS
         self.wtime = int(self.screentime / 20 % self.WIDTH)
-        self.ship.get_keys()
-        self.ship.update()
-        self.bullets.update()
-        self.rocks.update()
+        profiler = self.profiler
+        for ship in self.ships:
+            ship.get_keys()
+            ship.update()
+        profiler.lap('ship')
+        if self.engine is not None:
+            self.engine.update()
+            rock_count = len(self.engine.rocks)
+            profiler.lap('entities')
+        else:
+            self.bullets.update()
+            profiler.lap('bullets')
+            self.rocks.update()
+            profiler.lap('rocks')
+            rock_count = len(self.rocks)
         self.explosions.update()
+        profiler.lap('explosions')
         self.ball.update()
+        profiler.lap('ball')
+        if self.particles is not None:
+            self.particles.update()
+        profiler.lap('particles')
+        now = self.get_ticks()
+        if self.game_over_at is not None and now >= self.game_over_at:
+            """The ships' final explosions have burnt out."""
+            self.playing = False
 
         """Spawn rocks."""
-        now = pg.time.get_ticks()
-        if len(self.rocks.sprites()) < AST_RANGE:
-            if now - self.rock_timer > 500 + random.choice(
+        if rock_count < self.ast_range:
+            if now - self.rock_timer > 500 + self.rng.choice(
                     [-50, 0, 50, 100, 150]):
                 self.rock_timer = now
-                Rocks(gm, self.dt)
-
-        """Check to see if a rock hits the ship."""
-        rock_hits = pg.sprite.spritecollide(
-            self.ship, self.rocks, True, pg.sprite.collide_rect_ratio(0.5))
-        if rock_hits:
-            self.explosion_sound.play()
-            Explosion(gm, self.ship.rect.center, 1)
+                if self.engine is not None:
+                    self.engine.add_rock()
+                else:
+                    Rocks(self, self.dt)
+        profiler.lap('spawn_rocks')
+
+        """Check to see if a rock hits a ship."""
+        for ship in self.ships:
+            if not ship.alive():
+                continue
+            if self.engine is not None:
+                rock_hits = self.engine.collide_ship(ship)
+            else:
+                rock_hits = self.grid.spritecollide(
+                    ship, self.rocks, True, collide_mask)
+            if not rock_hits:
+                continue
+            self.audio.play('explosion')
+            self.explode(ship.rect.center, 1)
+            self.scatter(ship.rect.center, PARTICLE_BURST * 2)
             self.my_lives -= 1
             if self.my_lives == 0:
-                self.explosion_sound.play()
-                # Explosion(gm, self.ship.rect.center, 2)
-                self.playing = False
+                """Blow the ships up and end once the explosions are over."""
+                self.audio.play('explosion')
+                self.game_over_at = self.get_ticks() + self.blast_ms(2)
+                for other in self.ships:
+                    if other.alive():
+                        self.explode(other.rect.center, 2)
+                        self.scatter(other.rect.center, PARTICLE_BURST * 4)
+                        other.kill()
+                break
+        profiler.lap('hit_ship')
 
         """Check to see if a bullet hit a rock."""
-        bullet_hits = pg.sprite.groupcollide(
-            self.rocks, self.bullets, True, True,
-            pg.sprite.collide_circle_ratio(0.5))
-        for hit in bullet_hits:
-            Explosion(gm, hit.rect.center, 0)
-            self.explosion_sound.play()
+        if self.engine is not None:
+            bullet_hits = self.engine.collide_bullets()
+        else:
+            bullet_hits = [
+                (rock.rect.center, rock.vel, rock.size, rock.image_index)
+                for rock in self.grid.groupcollide(
+                    self.rocks, self.bullets, True, True, collide_mask)]
+        for center, vel, size, image in bullet_hits:
+            self.explode(center, min(size, 1))
+            self.scatter(center, PARTICLE_BURST >> size)
+            self.audio.play('explosion')
             self.my_score += 10
+            self.fragment(center, vel, size, image)
+        profiler.lap('hit_rocks')
 
         """Spawn energy ball."""
-        if not self.ball and self.ship.energy < 50 and random.randrange(
-                100) < POWERUP_PCT:
-            Ball(gm, self.dt)
+        if (not self.ball and min(ship.energy for ship in self.ships) < 50
+                and self.rng.randrange(100) < POWERUP_PCT):
+            Ball(self, self.dt)
+        profiler.lap('spawn_ball')
 
         """Check to see if a bullet hit an energy ball."""
-        ball_hits = pg.sprite.groupcollide(
-            self.ball, self.bullets, True, True,
-            pg.sprite.collide_circle_ratio(0.5))
+        if self.engine is not None:
+            ball_hits = self.engine.collide_group(self.ball)
+        else:
+            ball_hits = self.grid.groupcollide(
+                self.ball, self.bullets, True, True, collide_mask)
         for hit in ball_hits:
-            Explosion(gm, hit.rect.center, 0)
-            self.explosion_sound.play()
-            self.ship.energy = 100
-
-    def draw(self):
-        """Draw game screen."""
-        self.screen.blit(self.stars, (0, 0))
-        self.screen.blit(self.debris, ((self.wtime - self.WIDTH), 0))
-        self.screen.blit(self.debris, (self.wtime, 0))
-        self.draw_lives(self.screen, 120, 30, self.my_lives, self.little_ship)
-        self.draw_text("Laser Missiles: ", 22, WHITE, self.WIDTH - 330, 36)
-        self.draw_energy_bar(
-            self.screen, self.WIDTH - 250, 40, self.ship.energy)
-        self.draw_text("Score: " + str(
-            self.my_score), 22, WHITE, self.WIDTH / 2, 15)
-        self.all_sprites.draw(self.screen)
-        pg.display.flip()
+            self.explode(hit.rect.center, 0)
+            self.scatter(hit.rect.center, PARTICLE_BURST)
+            self.audio.play('explosion')
+            for ship in self.ships:
+                ship.energy = 100
+        profiler.lap('hit_ball')
+        self.audio.flush(self.get_ticks())
+        profiler.lap('audio')
+
+    def interpolate(self, alpha):
+        """Place the moving sprites alpha of the way through the last update.
+
+        interpolate(1) puts them back where the update left them.
+        """
+        for sprite in self.all_sprites:
+            prev_pos = getattr(sprite, 'prev_pos', None)
+            if prev_pos is not None:
+                sprite.place(prev_pos.lerp(sprite.pos, alpha))
+
+    def draw(self, alpha=1.0):
+        """Draw game screen alpha of the way from the last update to the next.
+
+        Sprites are moved back to their updated rects afterwards, as the
+        collision checks and the ship's guns work from those.
+        """
+        if alpha < 1:
+            self.interpolate(alpha)
+        if self.dirty_rects:
+            self.draw_dirty(alpha)
+        else:
+            self.screen.blit(self.backdrop.get(self.wtime), (0, 0))
+            self.draw_hud()
+            if self.engine is not None:
+                self.engine.draw(self.screen, alpha)
+            self.all_sprites.draw(self.screen)
+            if self.particles is not None:
+                self.particles.draw(self.screen, alpha)
+            if self.show_profile:
+                self.draw_profile()
+            pg.display.flip()
+        if self.capture is not None:
+            self.capture.grab(self.screen, self.get_ticks())
+        if alpha < 1:
+            self.interpolate(1)
+
+    def draw_dirty(self, alpha=1.0):
+        """Draw game screen, pushing only the areas that changed.
+
+        When the debris scrolls the backdrop is rebuilt, which dirties the
+        whole screen and flips it. Otherwise only the background under the
+        last sprite and HUD positions is restored and those rects are
+        updated, unless they cover more than DIRTY_FULL_PCT of the screen.
+        """
+        full = self.backdrop.stale(self.wtime)
+        background = self.backdrop.get(self.wtime)
+        if full:
+            self.screen.blit(background, (0, 0))
+        else:
+            self.all_sprites.clear(self.screen, background)
+            for rect in self.hud_rects:
+                self.screen.blit(background, rect, rect)
+        dirty = []
+        for batch in (self.engine, self.particles):
+            if batch is not None:
+                for rect in batch.rects:
+                    self.screen.blit(background, rect, rect)
+                dirty += batch.rects
+        hud_rects = self.draw_hud()
+        if self.engine is not None:
+            dirty += self.engine.draw(self.screen, alpha)
+        dirty += self.all_sprites.draw(self.screen)
+        if self.particles is not None:
+            dirty += self.particles.draw(self.screen, alpha)
+        if self.show_profile:
+            hud_rects.append(self.draw_profile())
+        dirty += self.hud_rects + hud_rects
+        self.hud_rects = hud_rects
+        area = sum(rect.width * rect.height for rect in dirty)
+        if full or area * 100 > self.WIDTH * self.HEIGHT * DIRTY_FULL_PCT:
+            pg.display.flip()
+        else:
+            pg.display.update(dirty)
+
+    def draw_hud(self):
+        """Draw lives, laser bar and score, returning their rects."""
+        return [
+            self.draw_lives(
+                self.screen, 120, 30, self.my_lives, self.little_ship),
+            self.draw_text(
+                "Laser Missiles: ", 22, WHITE, self.WIDTH - 330, 36),
+            self.draw_energy_bar(
+                self.screen, self.WIDTH - 250, 40, self.ship.energy),
+            self.draw_text("Score: " + str(
+                self.my_score), 22, WHITE, self.WIDTH / 2, 15)]
+
+    def draw_profile(self):
+        """Draw the performance overlay and return its rect.
+
+        The panel shows the rolling average of every phase and count and
+        a graph of recent frame times against the 1/render_fps budget. It
+        is rebuilt every PROFILE_REFRESH frames.
+        """
+        frames = self.profiler.frames
+        if frames and (self.profile_panel is None
+                       or self.screentime % PROFILE_REFRESH == 0):
+            font = self.text_renderer.font(16)
+            lines = ["{}: {:.2f}".format(name, value) for name, value in
+                     self.profiler.averages().items()]
+            graph_height = 60
+            panel = pg.Surface(
+                (260, 18 * len(lines) + graph_height + 16), pg.SRCALPHA)
+            panel.fill((0, 0, 0, 160))
+            for row, line in enumerate(lines):
+                panel.blit(font.render(line, True, WHITE), (8, 4 + 18 * row))
+            bottom = panel.get_height() - 8
+            budget = 1000 / self.render_fps
+            scale = graph_height / (2 * budget)
+            pg.draw.line(panel, ORANGE, (8, bottom - budget * scale),
+                         (252, bottom - budget * scale))
+            points = [(8 + x * 244 / frames.maxlen,
+                       bottom - min(record['frame'], 2 * budget) * scale)
+                      for x, record in enumerate(frames)]
+            if len(points) > 1:
+                pg.draw.lines(panel, GREEN, False, points)
+            self.profile_panel = panel
+        if self.profile_panel is None:
+            return pg.Rect(10, 0, 0, 0)
+        rect = self.profile_panel.get_rect(bottomleft=(10, self.HEIGHT - 10))
+        self.screen.blit(self.profile_panel, rect)
+        return rect
 
     def show_start_screen(self):
         """Game splash/start screen."""
-        pg.mixer.music.load(path.join(self.snd_dir, 'start.ogg'))
-        pg.mixer.music.play(loops=-1)
-        pg.mixer.music.set_volume(0.3)
-        self.screen.blit(self.stars, (0, 0))
+        self.music.play('start', 0.3)
+        self.screen.blit(self.backdrop.stars, (0, 0))
         self.screen.blit(
             self.one_ship, (self.WIDTH // 2 - 50, self.HEIGHT // 4))
         self.draw_text(
@@ -478,16 +2489,14 @@ class Game:
             22, WHITE, self.WIDTH // 2, 15)
         pg.display.flip()
         self.wait_for_key()
-        pg.mixer.music.fadeout(500)
+        self.music.fadeout(500)
 
     def show_end_screen(self):
         """Draw game over/continue screen."""
         if not self.running:
             return
-        pg.mixer.music.load(path.join(self.snd_dir, 'start.ogg'))
-        pg.mixer.music.play(loops=-1)
-        pg.mixer.music.set_volume(0.3)
-        self.screen.blit(self.stars, (0, 0))
+        self.music.play('start', 0.3)
+        self.screen.blit(self.backdrop.stars, (0, 0))
         self.screen.blit(self.one_ship, (
             self.WIDTH // 2 - 50, self.HEIGHT // 4))
         self.draw_text(
@@ -514,13 +2523,14 @@ class Game:
                            self.WIDTH / 2, self.HEIGHT / 2 + 40)
         pg.display.flip()
         self.wait_for_key()
-        pg.mixer.music.fadeout(500)
+        self.music.fadeout(500)
 
     def wait_for_key(self):
         """Waiting for key press to clear start and end game screens."""
         waiting = True
         while waiting:
             self.clock.tick(FPS)
+            self.music.poll()
             for event in pg.event.get():
                 if (event.type == pg.QUIT or event.type == pg.KEYDOWN
                         and event.key == pg.K_ESCAPE):
@@ -535,19 +2545,22 @@ class Game:
         x = int(x)
         y = int(y)
         size = int(size)
-        font = pg.font.Font(self.font_name, size)
-        text_surface = font.render(text, True, color)
+        text_surface = self.text_renderer.render(text, size, color)
         text_rect = text_surface.get_rect()
         text_rect.midtop = (x, y)
         self.screen.blit(text_surface, text_rect)
+        return text_rect
 
     def draw_lives(self, surf, x, y, lives, pic):
         """Now add little ship images for lives display."""
+        area = pg.Rect(x, y, 0, 0)
         for life in range(lives):
             img_rect = pic.get_rect()
             img_rect.x = x + 50 * life
             img_rect.y = y
             surf.blit(pic, img_rect)
+            area.union_ip(img_rect)
+        return area
 
     def draw_energy_bar(self, surf, x, y, pct):
         """Now add energy bar."""
@@ -567,13 +2580,179 @@ class Game:
         else:
             pg.draw.rect(surf, RED, fill_rect)
             pg.draw.rect(surf, WHITE, outline_rect, 1)
+        return outline_rect
+
+def logical_size(width, height, limit=LOGICAL_SIZE):
+    """Return width x height scaled down, keeping its shape, to fit limit."""
+    scale = min(1.0, limit[0] / width, limit[1] / height)
+    return int(width * scale), int(height * scale)
+
+def positive(text):
+    """Parse a command line argument that must be a whole number above 0."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value <= 0:
+        raise argparse.ArgumentTypeError(
+            "expected a positive whole number, not {!r}".format(text))
+    return value
+
+def resolution(text):
+    """Parse a WIDTHxHEIGHT command line argument."""
+    try:
+        width, height = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "expected WIDTHxHEIGHT, not {!r}".format(text))
+    return width, height
+
+def measure_ship_render(game, frames=FPS * 10):
+    """Time the ship sprite per frame with and without the frame cache.
+
+    Returns the mean milliseconds per frame for a fresh pg.transform.rotate
+    of the ship and for the ship_frames lookup, sweeping every angle with
+    both the plain and thrust images.
+    """
+    images = (game.one_ship, game.two_ship)
+    start = time.perf_counter()
+    for frame in range(frames):
+        image = pg.transform.rotate(images[frame % 2], frame % 360)
+        rect = image.get_rect()
+    transform = time.perf_counter() - start
+    start = time.perf_counter()
+    for frame in range(frames):
+        image, rect = game.ship_frames.get(images[frame % 2], None,
+                                           frame % 360)
+        rect = rect.copy()
+    cached = time.perf_counter() - start
+    return {'transform_ms': transform * 1000 / frames,
+            'cached_ms': cached * 1000 / frames}
+
+def start_capture(game, args):
+    """Give game a FrameCapture if --capture was asked for."""
+    if args.capture:
+        game.capture = FrameCapture(
+            game.screen, args.capture, args.capture_size, args.capture_fps,
+            args.capture_format)
+
+def main():
+    """Parse the command line, then play or simulate the game."""
+    parser = argparse.ArgumentParser(description="Asteroids")
+    parser.add_argument(
+        '--dirty-rects', action='store_true',
+        help="only redraw the parts of the screen that change")
+    parser.add_argument(
+        '--vectorized', action='store_true',
+        help="keep bullets and rocks in NumPy arrays (needs numpy)")
+    parser.add_argument(
+        '--resolution', type=resolution, metavar='WxH',
+        help="draw the game at this size and scale it to the screen")
+    parser.add_argument(
+        '--fixed-quality', action='store_true',
+        help="never lower the drawing quality to keep up the frame rate")
+    parser.add_argument(
+        '--render-fps', type=positive, default=FPS, metavar='HZ',
+        help="draw at HZ frames a second; the game still steps at %d" % FPS)
+    parser.add_argument(
+        '--profile-out', metavar='FILE',
+        help="write per-frame phase timings to FILE (.csv or JSON lines)")
+    parser.add_argument(
+        '--capture', metavar='DIR',
+        help="save the frames shown to DIR without slowing the game")
+    parser.add_argument(
+        '--capture-format', choices=('png', 'raw'), default='png',
+        help="numbered PNGs or one raw RGB stream (default %(default)s)")
+    parser.add_argument(
+        '--capture-size', type=resolution, metavar='WxH',
+        help="scale captured frames to this size")
+    parser.add_argument(
+        '--capture-fps', type=positive, default=FPS, metavar='HZ',
+        help="capture at most HZ frames a second of game time")
+    parser.add_argument(
+        '--measure-ship', action='store_true',
+        help="time drawing the ship with and without its frame cache")
+    parser.add_argument(
+        '--bake-assets', action='store_true',
+        help="pack the images into the asset cache and exit")
+    parser.add_argument(
+        '--headless', type=int, metavar='FRAMES',
+        help="simulate FRAMES frames without a display and report the rate")
+    parser.add_argument(
+        '--render', action='store_true',
+        help="also draw every headless frame to the dummy display")
+    parser.add_argument(
+        '--record', metavar='FILE',
+        help="save the seed and every frame's keys to FILE")
+    parser.add_argument(
+        '--replay', metavar='FILE',
+        help="re-run a recorded session and check its scores")
+    parser.add_argument(
+        '--watch', action='store_true',
+        help="show the replay on screen at normal speed")
+    args = parser.parse_args()
+
+    if args.measure_ship:
+        gm = Game(headless=True)
+        times = measure_ship_render(gm)
+        print("Ship per frame: rotate {transform_ms:.4f} ms, "
+              "cached {cached_ms:.4f} ms".format(**times))
+    elif args.bake_assets:
+        gm = Game(headless=True)
+        gm.atlas.bake(gm.decode_images(gm.img_dir))
+        print("Baked {}".format(gm.atlas.pixels))
+    elif args.replay:
+        log = SessionLog.load(args.replay)
+        gm = Game(headless=not args.watch, input_source=ReplayInput(log.masks),
+                  vectorized=log.vectorized, seed=log.seed, size=log.size)
+        gm.dt = log.dt
+        start_capture(gm, args)
+        stats = gm.simulate(len(log.masks),
+                            args.render or args.watch or bool(args.capture),
+                            args.watch)
+        print("{frames} frames, {games} games in {seconds:.2f}s: "
+              "{fps:.0f} frames/s".format(**stats))
+        if stats['scores'] != log.scores and gm.running:
+            print("Replay scores {} differ from the recorded {}".format(
+                stats['scores'], log.scores))
+            pg.quit()
+            sys.exit(1)
+        print("Scores match: {}".format(log.scores))
+    elif args.headless:
+        gm = Game(headless=True, input_source=ScriptedInput(DEMO_SCRIPT),
+                  vectorized=args.vectorized)
+        start_capture(gm, args)
+        stats = gm.simulate(args.headless,
+                            args.render or bool(args.capture))
+        print("{frames} frames, {games} games in {seconds:.2f}s: "
+              "{fps:.0f} frames/s".format(**stats))
+    else:
+        #Create the game object and start.
+        seed = random.randrange(1 << 32) if args.record else None
+        gm = Game(vectorized=args.vectorized, profile_out=args.profile_out,
+                  seed=seed, size=args.resolution,
+                  render_fps=args.render_fps,
+                  adaptive_quality=False if args.fixed_quality else None)
+        gm.dirty_rects = args.dirty_rects
+        start_capture(gm, args)
+        if args.record:
+            gm.input = InputRecorder()
+        gm.show_start_screen()
+        while gm.running:
+            gm.new()
+            gm.show_end_screen()
+        gm.profiler.close()
+        if args.record:
+            SessionLog(seed, gm.dt, (gm.WIDTH, gm.HEIGHT), gm.vectorized,
+                       gm.input.masks, gm.scores).save(args.record)
+
+    if gm.capture is not None:
+        gm.capture.close()
+        print("Captured {} frames to {}, dropped {}".format(
+            gm.capture.written, args.capture, gm.capture.dropped))
 
-#Create the game object and start.
-gm = Game()
-gm.show_start_screen()
-while gm.running:
-    gm.new()
-    gm.show_end_screen()
+    #End of game.
+    pg.quit()
 
-#End of game.
-pg.quit()
+if __name__ == '__main__':
+    main()
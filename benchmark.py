@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark suite for the Asteroids game loop.
+
+Each scenario runs a headless game with a fixed random seed and the bot
+pilot at the controls, timing update() and draw() separately on every
+frame. Results are printed as mean/p50/p95/p99 milliseconds and can be
+written to a JSON file and compared against a stored baseline, e.g.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json
+
+A scenario whose p95 frame time grows by more than --tolerance percent
+over the baseline is reported as a regression and the exit status is 1.
+A baseline run with another seed or engine is refused with exit status
+2, and scenarios it timed over a different number of frames are skipped.
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import pygame as pg
+
+import asteroids
+
+SEED = 1234
+FRAMES = 600
+WARMUP = 60
+TOLERANCE = 10
+
+class Scenario:
+    """A named workload: how many rocks, bullets and explosions to keep.
+
+    particles are thrown out every frame on top of those.
+    """
+
+    def __init__(self, name, rocks=asteroids.AST_RANGE, bullets=0,
+                 explosions=0, particles=0):
+        self.name = name
+        self.rocks = rocks
+        self.bullets = bullets
+        self.explosions = explosions
+        self.particles = particles
+
+    def setup(self, game):
+        """Fill a freshly reset game up to the scenario's rock count."""
+        game.ast_range = self.rocks
+        for count in range(self.rocks - self.rock_count(game)):
+            if game.engine is not None:
+                game.engine.add_rock()
+            else:
+                asteroids.Rocks(game, game.dt)
+
+    def rock_count(self, game):
+        if game.engine is not None:
+            return len(game.engine.rocks)
+        return len(game.rocks)
+
+    def tick(self, game, rng):
+        """Top up bullets and set off explosions before a frame."""
+        if game.engine is not None:
+            bullets = len(game.engine.bullets)
+        else:
+            bullets = len(game.bullets)
+        for count in range(self.bullets - bullets):
+            pos = (rng.randrange(game.WIDTH), rng.randrange(game.HEIGHT))
+            rot = rng.randrange(360)
+            direction = asteroids.vec(1, 0).rotate(-rot)
+            if game.engine is not None:
+                game.engine.add_bullet(pos, direction, rot)
+            else:
+                game.bullet_pool.acquire(pos, direction, rot, game.dt)
+        for count in range(self.explosions):
+            pos = (rng.randrange(game.WIDTH), rng.randrange(game.HEIGHT))
+            game.explosion_pool.acquire(pos, rng.randrange(3))
+        if self.particles:
+            pos = (rng.randrange(game.WIDTH), rng.randrange(game.HEIGHT))
+            game.scatter(pos, self.particles)
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    Scenario('baseline'),
+    Scenario('rocks_500', rocks=500),
+    Scenario('bullets_2000', bullets=2000),
+    Scenario('explosion_storm', explosions=20),
+    Scenario('particle_storm', rocks=40, particles=200),
+)}
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, int(math.ceil(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+def summarise(times):
+    """Mean and percentiles, in milliseconds, of a list of seconds."""
+    ordered = sorted(time * 1000 for time in times)
+    return {'mean': sum(ordered) / len(ordered),
+            'p50': percentile(ordered, 50),
+            'p95': percentile(ordered, 95),
+            'p99': percentile(ordered, 99)}
+
+def run_scenario(game, scenario, frames, warmup, seed):
+    """Play scenario for warmup + frames frames and time the last frames."""
+    game.rng.seed(seed)
+    rng = random.Random(seed)
+    game.ticks = 0
+    game.reset()
+    scenario.setup(game)
+    updates = []
+    draws = []
+    for frame in range(warmup + frames):
+        scenario.tick(game, rng)
+        start = time.perf_counter()
+        game.update()
+        middle = time.perf_counter()
+        game.draw()
+        end = time.perf_counter()
+        if frame >= warmup:
+            updates.append(middle - start)
+            draws.append(end - middle)
+        if not game.playing:
+            game.reset()
+            scenario.setup(game)
+    return {'frames': frames,
+            'update': summarise(updates),
+            'draw': summarise(draws),
+            'frame': summarise([u + d for u, d in zip(updates, draws)])}
+
+def mismatches(results, baseline):
+    """Return the run settings that differ between results and baseline."""
+    return ["{} {} vs {}".format(key, baseline.get(key), results[key])
+            for key in ('seed', 'vectorized')
+            if baseline.get(key) != results[key]]
+
+def compare(results, baseline, tolerance):
+    """Print the change in p95 frame time and return the regressions."""
+    for key in ('python', 'pygame'):
+        if baseline.get(key) != results[key]:
+            print("Warning: baseline {} {} vs {}".format(
+                key, baseline.get(key), results[key]))
+    regressions = []
+    for name, result in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            print("{:<16} no baseline".format(name))
+            continue
+        if old.get('frames') != result['frames']:
+            print("{:<16} baseline timed {} frames, not {}".format(
+                name, old.get('frames'), result['frames']))
+            continue
+        before = old['frame']['p95']
+        after = result['frame']['p95']
+        change = (after - before) / before * 100 if before else 0.0
+        print("{:<16} p95 {:7.3f} -> {:7.3f} ms ({:+.1f}%)".format(
+            name, before, after, change))
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Asteroids benchmarks")
+    parser.add_argument(
+        '--scenario', action='append', choices=sorted(SCENARIOS),
+        help="scenario to run, may be repeated (default: all)")
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--warmup', type=int, default=WARMUP)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument(
+        '--vectorized', action='store_true',
+        help="run with the NumPy entity engine")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument(
+        '--tolerance', type=float, default=TOLERANCE,
+        help="allowed p95 frame time growth in percent")
+    args = parser.parse_args()
+
+    game = asteroids.Game(headless=True, vectorized=args.vectorized)
+    game.input = asteroids.BotPilot(game)
+    results = {'seed': args.seed, 'vectorized': args.vectorized,
+               'python': platform.python_version(),
+               'pygame': pg.version.ver, 'scenarios': {}}
+    for name in args.scenario or list(SCENARIOS):
+        result = run_scenario(game, SCENARIOS[name], args.frames,
+                              args.warmup, args.seed)
+        results['scenarios'][name] = result
+        print("{:<16}".format(name) + "  ".join(
+            "{} mean {mean:.3f} p50 {p50:.3f} p95 {p95:.3f} "
+            "p99 {p99:.3f}".format(part, **result[part])
+            for part in ('update', 'draw')))
+    pg.quit()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differ = mismatches(results, baseline)
+        if differ:
+            print("Baseline not comparable: " + ", ".join(differ))
+            return 2
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressed: " + ", ".join(regressions))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
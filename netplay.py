@@ -0,0 +1,764 @@
+#!/usr/bin/env python3
+
+"""
+Co-operative network play for Asteroids over UDP.
+
+The server owns the only real Game and runs its update() at TICK_RATE.
+Each player's key presses drive one ship; the players share the score
+and the lives. Every SNAPSHOT_INTERVAL ticks each client is sent the
+ships, rocks, bullets and energy ball, quantized to POS_SCALE pixels and
+ANGLE_SCALE steps and delta encoded against the last snapshot that
+client acknowledged. A moved entity costs seven bytes, a new one ten and
+an unchanged one nothing.
+
+Clients send one key mask per tick, repeating the last INPUT_REDUNDANCY
+of them so a lost datagram costs nothing. They predict their own ship
+and correct it from each snapshot by replaying the inputs the server has
+not yet seen. Everything else is drawn INTERP_TICKS behind the newest
+snapshot, interpolated between the two either side.
+
+    python netplay.py --serve
+    python netplay.py --connect 192.168.1.10
+    python netplay.py --loopback --players 1 2 4 8 --latency 40 --loss 5
+
+The last runs a server and scripted clients over 127.0.0.1, with
+simulated latency, jitter and loss, and reports the server tick time and
+the bandwidth per client for each number of players.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import struct
+import time
+import pygame as pg
+
+import asteroids
+
+PORT = 47700
+TICK_RATE = asteroids.FPS
+SNAPSHOT_INTERVAL = 2
+SNAPSHOT_HISTORY = 64
+INTERP_TICKS = 6
+INPUT_REDUNDANCY = 4
+INPUT_BACKLOG = 8
+JOIN_RETRY = 0.5
+CLIENT_TIMEOUT = 3.0
+MAX_PLAYERS = 8
+POS_SCALE = 4
+ANGLE_SCALE = 65536 / 360
+NO_SHIP = 0xFFFF
+SECONDS = 5
+
+JOIN, WELCOME, INPUT, SNAPSHOT, LEAVE = range(1, 6)
+SHIP, ROCK, BULLET, BALL = range(4)
+THRUST = 0x80
+
+KIND = struct.Struct('<B')
+WELCOME_MSG = struct.Struct('<BHHH')
+INPUT_MSG = struct.Struct('<BIIB')
+SNAP_HEADER = struct.Struct('<BIIIIBHHHH')
+FULL_RECORD = struct.Struct('<HBHHHB')
+DELTA_RECORD = struct.Struct('<HbbhB')
+REMOVED = struct.Struct('<H')
+
+class EntityIds:
+    """Stable 16 bit ids for the sprites sent in snapshots.
+
+    A sprite keeps its id while it stays in the snapshots. Ids of
+    sprites that drop out are forgotten, so a pooled Bullet that comes
+    back is sent as a new entity.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.next = 1
+
+    def get(self, sprite):
+        number = self.ids.get(sprite)
+        if number is None:
+            used = set(self.ids.values())
+            while self.next in used or self.next == NO_SHIP:
+                self.next = self.next % NO_SHIP + 1
+            number = self.ids[sprite] = self.next
+            self.next = self.next % NO_SHIP + 1
+        return number
+
+    def keep(self, sprites):
+        """Forget every sprite not in sprites."""
+        self.ids = {sprite: number for sprite, number in self.ids.items()
+                    if sprite in sprites}
+
+def quantize(game, ids):
+    """Return {id: (kind, x, y, angle, extra)} for the game's entities."""
+    width, height = game.WIDTH, game.HEIGHT
+    state = {}
+    sent = set()
+
+    def add(sprite, kind, angle, extra):
+        sent.add(sprite)
+        x = int(sprite.pos.x % width * POS_SCALE)
+        y = int(sprite.pos.y % height * POS_SCALE)
+        state[ids.get(sprite)] = (kind, x, y,
+                                  int(angle % 360 * ANGLE_SCALE) & 0xFFFF,
+                                  extra)
+
+    for ship in game.ships:
+        if ship.alive():
+            thrust = THRUST if ship.base_image is game.two_ship else 0
+            add(ship, SHIP, ship.rot,
+                thrust | max(0, min(int(ship.energy), 100)))
+    for rock in game.rocks:
+        add(rock, ROCK, rock.angle, rock.size << 4 | rock.image_index)
+    for bullet in game.bullets:
+        add(bullet, BULLET, bullet.rot, 0)
+    for ball in game.ball:
+        add(ball, BALL, ball.angle, 0)
+    ids.keep(sent)
+    return state
+
+def encode_snapshot(tick, base_tick, base, state, ack, score, lives, ship):
+    """Pack state as a delta from base, the state at base_tick."""
+    full = []
+    delta = []
+    for number, record in state.items():
+        old = base.get(number)
+        if old == record:
+            continue
+        if old is not None and old[0] == record[0]:
+            dx = record[1] - old[1]
+            dy = record[2] - old[2]
+            turn = (record[3] - old[3] + 0x8000) % 0x10000 - 0x8000
+            if -128 <= dx < 128 and -128 <= dy < 128:
+                delta.append(DELTA_RECORD.pack(number, dx, dy, turn,
+                                               record[4]))
+                continue
+        full.append(FULL_RECORD.pack(number, *record))
+    removed = [REMOVED.pack(number) for number in base
+               if number not in state]
+    header = SNAP_HEADER.pack(SNAPSHOT, tick, base_tick, ack, score, lives,
+                              ship, len(full), len(delta), len(removed))
+    return b''.join([header] + full + delta + removed)
+
+def decode_snapshot(data, states):
+    """Unpack a snapshot against the states already received.
+
+    Returns (header fields, state), or None when its base is unknown.
+    """
+    header = SNAP_HEADER.unpack_from(data)
+    _, tick, base_tick, ack, score, lives, ship, full, delta, removed = header
+    if base_tick == 0:
+        base = {}
+    elif base_tick in states:
+        base = states[base_tick]
+    else:
+        return None
+    state = dict(base)
+    offset = SNAP_HEADER.size
+    for index in range(full):
+        number, *record = FULL_RECORD.unpack_from(data, offset)
+        state[number] = tuple(record)
+        offset += FULL_RECORD.size
+    for index in range(delta):
+        number, dx, dy, turn, extra = DELTA_RECORD.unpack_from(data, offset)
+        kind, x, y, angle, _ = base[number]
+        state[number] = (kind, x + dx, y + dy, (angle + turn) & 0xFFFF, extra)
+        offset += DELTA_RECORD.size
+    for index in range(removed):
+        number, = REMOVED.unpack_from(data, offset)
+        state.pop(number, None)
+        offset += REMOVED.size
+    return header, state
+
+def move_ship(ship, mask, width, height):
+    """Step a predicted (x, y, rot) ship one tick the way Ship does."""
+    x, y, rot = ship
+    keys = asteroids.mask_keys(mask)
+    rot_speed = 0
+    if keys[pg.K_LEFT]:
+        rot_speed = asteroids.SHIP_ROT_SPEED
+    if keys[pg.K_RIGHT]:
+        rot_speed = -asteroids.SHIP_ROT_SPEED
+    vel = asteroids.vec(0, 0)
+    if keys[pg.K_UP]:
+        vel = asteroids.vec(asteroids.SHIP_VEL, 0).rotate(-rot)
+    dt = asteroids.SIM_DT
+    return ((x + vel.x * dt) % width, (y + vel.y * dt) % height,
+            (rot + rot_speed * dt) % 360)
+
+def wrap_lerp(a, b, alpha, period):
+    """Interpolate from a to b the short way round period."""
+    step = (b - a + period / 2) % period - period / 2
+    return (a + step * alpha) % period
+
+class LossyLink:
+    """Datagram sender that can delay, jitter and drop what it sends.
+
+    latency and jitter are in milliseconds and loss in percent. A link
+    with none of them sends straight away.
+    """
+
+    def __init__(self, transport, latency=0, jitter=0, loss=0, seed=None):
+        self.transport = transport
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.dropped = 0
+
+    def sendto(self, data, addr=None):
+        if self.loss and self.rng.random() * 100 < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay <= 0:
+            self.transport.sendto(data, addr)
+            return
+        asyncio.get_running_loop().call_later(
+            delay / 1000, self.send_late, data, addr)
+
+    def send_late(self, data, addr):
+        if not self.transport.is_closing():
+            self.transport.sendto(data, addr)
+
+class NetInput:
+    """Input source holding the keys a remote player last sent."""
+
+    def __init__(self):
+        self.keys = asteroids.KeyState()
+        self.peer = None
+
+    def get_pressed(self):
+        return self.keys
+
+class Peer:
+    """The server's view of one connected client."""
+
+    def __init__(self, addr, slot, now):
+        self.addr = addr
+        self.slot = slot
+        self.inputs = {}
+        self.seq = 0
+        self.acked = 0
+        self.last_seen = now
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+
+class GameServer(asyncio.DatagramProtocol):
+    """Authoritative server running one Game for every player.
+
+    Slot 0 drives the game's own ship and later players get co-op ships
+    from Game.add_ship(), up to MAX_PLAYERS; further JOINs get no WELCOME.
+    Each tick applies the oldest input a player has sent that the game has
+    not seen, skipping inputs that were lost and dropping the oldest
+    beyond INPUT_BACKLOG so lag cannot build up. When a player leaves or
+    goes quiet for CLIENT_TIMEOUT seconds their ship is taken out of play
+    and the slot is kept for the next player to join. The game only runs
+    while someone is connected and restarts on game over.
+    """
+
+    def __init__(self, tick_rate=TICK_RATE, interval=SNAPSHOT_INTERVAL,
+                 latency=0, jitter=0, loss=0, seed=None):
+        self.slots = [NetInput()]
+        self.game = asteroids.Game(headless=True, input_source=self.slots[0],
+                                   seed=seed)
+        self.game.reset()
+        self.tick_rate = tick_rate
+        self.interval = interval
+        self.link_options = (latency, jitter, loss, seed)
+        self.link = None
+        self.peers = {}
+        self.ids = EntityIds()
+        self.history = {}
+        self.tick = 0
+        self.tick_times = []
+        self.running = True
+
+    def connection_made(self, transport):
+        self.link = LossyLink(transport, *self.link_options)
+
+    def datagram_received(self, data, addr):
+        if not data:
+            return
+        kind, = KIND.unpack_from(data)
+        peer = self.peers.get(addr)
+        if kind == JOIN:
+            if peer is None:
+                peer = self.join(addr)
+                if peer is None:
+                    return
+            self.link.sendto(WELCOME_MSG.pack(
+                WELCOME, peer.slot, self.game.WIDTH, self.game.HEIGHT), addr)
+        if peer is None:
+            return
+        peer.last_seen = time.perf_counter()
+        peer.bytes_received += len(data)
+        if kind == INPUT:
+            if len(data) < INPUT_MSG.size:
+                return
+            _, seq, acked, count = INPUT_MSG.unpack_from(data)
+            peer.acked = max(peer.acked, acked)
+            masks = data[INPUT_MSG.size:INPUT_MSG.size + count]
+            for back, mask in enumerate(masks):
+                if seq - back > peer.seq:
+                    peer.inputs[seq - back] = mask
+        elif kind == LEAVE:
+            self.leave(peer)
+
+    def join(self, addr):
+        """Seat a new player in a free slot or a new ship.
+
+        Returns the Peer, or None when MAX_PLAYERS are already playing.
+        """
+        for slot, source in enumerate(self.slots):
+            if source.peer is None:
+                break
+        else:
+            if len(self.slots) >= MAX_PLAYERS:
+                return None
+            source = NetInput()
+            self.slots.append(source)
+            slot = len(self.slots) - 1
+        self.seat(slot)
+        peer = Peer(addr, slot, time.perf_counter())
+        source.peer = peer
+        self.peers[addr] = peer
+        return peer
+
+    def leave(self, peer):
+        source = self.slots[peer.slot]
+        source.peer = None
+        source.keys = asteroids.KeyState()
+        self.unseat(peer.slot)
+        del self.peers[peer.addr]
+
+    def ship_of(self, slot):
+        """Return the ship slot flies, or None if it is out of play."""
+        source = self.slots[slot]
+        for ship in self.game.ships:
+            if ship.input is source or ship.input is None and slot == 0:
+                return ship
+        return None
+
+    def seat(self, slot):
+        """Put a ship in play for slot if it has none."""
+        if self.ship_of(slot) is not None:
+            return
+        if slot == 0:
+            self.game.launch(self.slots[0])
+        else:
+            self.game.add_ship(self.slots[slot])
+
+    def unseat(self, slot):
+        """Take slot's ship out of play until a player takes the slot."""
+        ship = self.ship_of(slot)
+        if ship is None:
+            return
+        ship.kill()
+        self.game.ships.remove(ship)
+        if self.slots[slot] in self.game.crew:
+            self.game.crew.remove(self.slots[slot])
+
+    def step(self):
+        """Run one tick and send the snapshots that are due."""
+        start = time.perf_counter()
+        for peer in list(self.peers.values()):
+            if start - peer.last_seen > CLIENT_TIMEOUT:
+                self.leave(peer)
+                continue
+            while len(peer.inputs) > INPUT_BACKLOG:
+                peer.seq = min(peer.inputs)
+                del peer.inputs[peer.seq]
+            if peer.inputs:
+                peer.seq = min(peer.inputs)
+                self.slots[peer.slot].keys = asteroids.mask_keys(
+                    peer.inputs.pop(peer.seq))
+        if not self.peers:
+            return
+        game = self.game
+        game.update()
+        if not game.playing:
+            game.end_game()
+            game.reset()
+            for slot, source in enumerate(self.slots):
+                if source.peer is None:
+                    self.unseat(slot)
+        self.tick += 1
+        if self.tick % self.interval == 0:
+            self.send_snapshots()
+        self.tick_times.append(time.perf_counter() - start)
+
+    def send_snapshots(self):
+        game = self.game
+        state = quantize(game, self.ids)
+        self.history[self.tick] = state
+        self.history.pop(self.tick - SNAPSHOT_HISTORY * self.interval, None)
+        for peer in self.peers.values():
+            base = self.history.get(peer.acked)
+            base_tick = peer.acked if base is not None else 0
+            ship = self.ship_of(peer.slot)
+            ship = NO_SHIP if ship is None or not ship.alive() else \
+                self.ids.get(ship)
+            data = encode_snapshot(self.tick, base_tick, base or {}, state,
+                                   peer.seq, game.my_score, game.my_lives,
+                                   ship)
+            peer.bytes_sent += len(data)
+            peer.snapshots += 1
+            self.link.sendto(data, peer.addr)
+
+    async def run(self, seconds=None):
+        """Tick at tick_rate, while anyone is connected, for seconds."""
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate
+        stop = None if seconds is None else loop.time() + seconds
+        wake = loop.time()
+        while self.running and (stop is None or loop.time() < stop):
+            if self.peers:
+                self.step()
+            wake += period
+            delay = wake - loop.time()
+            if delay < -period:
+                wake = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+class GameClient(asyncio.DatagramProtocol):
+    """Client that sends its player's keys and rebuilds the world.
+
+    source gives the keys as an input source would, or the keyboard when
+    None. step() is called once per tick by the client's own loop.
+    """
+
+    def __init__(self, source=None, latency=0, jitter=0, loss=0, seed=None):
+        self.source = source
+        self.link_options = (latency, jitter, loss, seed)
+        self.link = None
+        self.slot = None
+        self.size = None
+        self.joined_at = None
+        self.welcome = asyncio.get_running_loop().create_future()
+        self.states = {}
+        self.latest = 0
+        self.header = None
+        self.render_tick = 0.0
+        self.seq = 0
+        self.pending = []
+        self.ship_id = NO_SHIP
+        self.predicted = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+        self.corrections = 0
+        self.error = 0.0
+
+    def connection_made(self, transport):
+        self.link = LossyLink(transport, *self.link_options)
+        self.join()
+
+    def join(self):
+        self.joined_at = time.perf_counter()
+        self.send(KIND.pack(JOIN))
+
+    def send(self, data):
+        self.bytes_sent += len(data)
+        self.link.sendto(data)
+
+    def datagram_received(self, data, addr):
+        self.bytes_received += len(data)
+        if not data:
+            return
+        kind, = KIND.unpack_from(data)
+        if kind == WELCOME and self.slot is None:
+            if len(data) != WELCOME_MSG.size:
+                return
+            _, self.slot, width, height = WELCOME_MSG.unpack(data)
+            self.size = (width, height)
+            if not self.welcome.done():
+                self.welcome.set_result(self.size)
+        elif kind == SNAPSHOT and self.size is not None:
+            self.receive(data)
+
+    def receive(self, data):
+        try:
+            decoded = decode_snapshot(data, self.states)
+        except (struct.error, KeyError):
+            return
+        if decoded is None:
+            return
+        header, state = decoded
+        tick = header[1]
+        self.snapshots += 1
+        self.states[tick] = state
+        for old in [old for old in self.states
+                    if old <= tick - SNAPSHOT_HISTORY * SNAPSHOT_INTERVAL]:
+            del self.states[old]
+        if tick <= self.latest:
+            return
+        self.latest = tick
+        self.header = header
+        self.reconcile(header[3], header[6], state)
+
+    def reconcile(self, ack, ship_id, state):
+        """Restart the prediction from the server's ship and replay."""
+        self.pending = [(seq, mask) for seq, mask in self.pending
+                        if seq > ack]
+        self.ship_id = ship_id
+        record = state.get(ship_id)
+        if record is None:
+            self.predicted = None
+            return
+        ship = (record[1] / POS_SCALE, record[2] / POS_SCALE,
+                record[3] / ANGLE_SCALE)
+        for seq, mask in self.pending:
+            ship = move_ship(ship, mask, *self.size)
+        if self.predicted is not None:
+            width, height = self.size
+            dx = (ship[0] - self.predicted[0] + width / 2) % width - width / 2
+            dy = (ship[1] - self.predicted[1] + height / 2) % height - \
+                height / 2
+            self.error += math.hypot(dx, dy)
+            self.corrections += 1
+        self.predicted = ship
+
+    def step(self):
+        """Send this tick's keys, predict the ship and advance the clock."""
+        if self.slot is None:
+            if time.perf_counter() - self.joined_at > JOIN_RETRY:
+                self.join()
+            return
+        if self.source is not None:
+            keys = self.source.get_pressed()
+        else:
+            keys = pg.key.get_pressed()
+        mask = asteroids.key_mask(keys)
+        self.seq += 1
+        self.pending.append((self.seq, mask))
+        if self.predicted is not None:
+            self.predicted = move_ship(self.predicted, mask, *self.size)
+        masks = bytes(mask for seq, mask in
+                      reversed(self.pending[-INPUT_REDUNDANCY:]))
+        self.send(INPUT_MSG.pack(INPUT, self.seq, self.latest, len(masks))
+                  + masks)
+        self.render_tick += 1
+        target = self.latest - INTERP_TICKS
+        if abs(target - self.render_tick) > INTERP_TICKS * 2:
+            self.render_tick = target
+        else:
+            self.render_tick += (target - self.render_tick) * 0.1
+
+    def leave(self):
+        if self.slot is not None:
+            self.send(KIND.pack(LEAVE))
+
+    def entities(self):
+        """Return (kind, x, y, angle, extra) for everything to draw.
+
+        Other entities are interpolated at render_tick and the player's
+        own ship is the predicted one.
+        """
+        ticks = sorted(self.states)
+        if not ticks:
+            return []
+        before = [tick for tick in ticks if tick <= self.render_tick]
+        after = [tick for tick in ticks if tick > self.render_tick]
+        old = self.states[before[-1] if before else ticks[0]]
+        new = self.states[after[0] if after else ticks[-1]]
+        alpha = 0.0
+        if before and after:
+            alpha = (self.render_tick - before[-1]) / (after[0] - before[-1])
+        width, height = self.size
+        drawn = []
+        for number, record in new.items():
+            if number == self.ship_id and self.predicted is not None:
+                x, y, angle = self.predicted
+                drawn.append((record[0], x, y, angle, record[4]))
+                continue
+            start = old.get(number, record)
+            drawn.append((
+                record[0],
+                wrap_lerp(start[1], record[1], alpha,
+                          width * POS_SCALE) / POS_SCALE,
+                wrap_lerp(start[2], record[2], alpha,
+                          height * POS_SCALE) / POS_SCALE,
+                wrap_lerp(start[3], record[3], alpha, 0x10000) / ANGLE_SCALE,
+                record[4]))
+        return drawn
+
+class ClientView:
+    """Draws a GameClient's world with the game's own graphics."""
+
+    def __init__(self, client):
+        self.client = client
+        self.game = asteroids.Game(size=client.size, adaptive_quality=False)
+
+    def draw(self):
+        game = self.game
+        screen = game.screen
+        screen.blit(game.backdrop.get(0), (0, 0))
+        for kind, x, y, angle, extra in self.client.entities():
+            if kind == SHIP:
+                image = game.two_ship if extra & THRUST else game.one_ship
+                frame, rect = game.ship_frames.get(image, None, angle)
+            elif kind == ROCK:
+                frame, rect = game.rot_cache.get(
+                    game.asteroid_images[extra & 0x0F],
+                    asteroids.ROCK_SIZES[extra >> 4], angle)
+            elif kind == BULLET:
+                frame, rect = game.rot_cache.get(game.bullet, None, angle)
+            else:
+                frame, rect = game.rot_cache.get(
+                    game.g_ball, asteroids.BALL_SIZE, angle)
+            screen.blit(frame, frame.get_rect(center=(int(x), int(y))))
+        header = self.client.header
+        if header is not None:
+            game.draw_lives(screen, 120, 30, header[5], game.little_ship)
+            game.draw_text("Score: " + str(header[4]), 22, asteroids.WHITE,
+                           game.WIDTH / 2, 15)
+        pg.display.flip()
+
+async def tick_loop(step, rate, running):
+    """Call step() rate times a second while running() is true."""
+    loop = asyncio.get_running_loop()
+    wake = loop.time()
+    while running():
+        step()
+        wake += 1 / rate
+        await asyncio.sleep(max(wake - loop.time(), 0))
+
+async def serve(port):
+    """Run a server until interrupted."""
+    loop = asyncio.get_running_loop()
+    server = GameServer()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: server, local_addr=('0.0.0.0', port))
+    print("Serving on UDP port {}".format(port))
+    try:
+        await server.run()
+    finally:
+        transport.close()
+
+async def play(host, port):
+    """Join the server at host and play in a window."""
+    loop = asyncio.get_running_loop()
+    client = GameClient()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: client, remote_addr=(host, port))
+    try:
+        await asyncio.wait_for(client.welcome, 10)
+        view = ClientView(client)
+        state = {'running': True}
+
+        def frame():
+            for event in pg.event.get():
+                if (event.type == pg.QUIT or event.type == pg.KEYDOWN
+                        and event.key == pg.K_ESCAPE):
+                    state['running'] = False
+            client.step()
+            view.draw()
+
+        await tick_loop(frame, TICK_RATE, lambda: state['running'])
+        client.leave()
+    finally:
+        transport.close()
+        pg.quit()
+
+async def loopback(players, seconds, latency, jitter, loss, seed):
+    """Run a server and players scripted clients on 127.0.0.1.
+
+    Returns the server tick times and the per-client byte, snapshot and
+    prediction statistics.
+    """
+    loop = asyncio.get_running_loop()
+    server = GameServer(latency=latency, jitter=jitter, loss=loss, seed=seed)
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: server, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    clients = []
+    transports = [transport]
+    script = list(asteroids.DEMO_SCRIPT)
+    for number in range(players):
+        shift = number * len(script) // players
+        client = GameClient(
+            asteroids.ScriptedInput(script[shift:] + script[:shift]),
+            latency, jitter, loss, None if seed is None else seed + number + 1)
+        client_transport, _ = await loop.create_datagram_endpoint(
+            lambda client=client: client, remote_addr=('127.0.0.1', port))
+        clients.append(client)
+        transports.append(client_transport)
+    stop = loop.time() + seconds
+
+    def step_clients():
+        for client in clients:
+            client.step()
+
+    try:
+        await asyncio.gather(
+            server.run(seconds),
+            tick_loop(step_clients, TICK_RATE, lambda: loop.time() < stop))
+        for client in clients:
+            client.leave()
+        await asyncio.sleep(max(latency + jitter, 0) / 1000 + 0.05)
+    finally:
+        for each in transports:
+            each.close()
+    return server, clients
+
+def report(players, seconds, server, clients):
+    """Print one line of loopback statistics."""
+    times = sorted(server.tick_times) or [0.0]
+    tick_mean = sum(times) / len(times) * 1000
+    tick_p95 = times[int(0.95 * (len(times) - 1))] * 1000
+    down = sum(client.bytes_received for client in clients) / len(clients)
+    up = sum(client.bytes_sent for client in clients) / len(clients)
+    snapshots = sum(client.snapshots for client in clients)
+    size = (sum(client.bytes_received for client in clients)
+            / max(snapshots, 1))
+    corrections = sum(client.corrections for client in clients)
+    error = sum(client.error for client in clients) / max(corrections, 1)
+    print("{:2d} players  tick mean {:5.2f} ms p95 {:5.2f} ms  "
+          "down {:6.2f} kB/s up {:5.2f} kB/s per client  "
+          "snapshot {:5.0f} B  prediction error {:4.2f} px".format(
+              players, tick_mean, tick_p95, down / seconds / 1000,
+              up / seconds / 1000, size, error))
+
+def main():
+    """Serve, connect or measure a loopback game."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--serve', action='store_true',
+                        help="run a server")
+    parser.add_argument('--connect', metavar='HOST',
+                        help="join the server on HOST")
+    parser.add_argument('--port', type=int, default=PORT,
+                        help="UDP port (default %(default)s)")
+    parser.add_argument('--loopback', action='store_true',
+                        help="measure a server and scripted clients locally")
+    parser.add_argument('--players', type=int, nargs='+', default=[1, 2, 4],
+                        help="player counts to measure (default 1 2 4)")
+    parser.add_argument('--seconds', type=float, default=SECONDS,
+                        help="seconds per measurement (default %(default)s)")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="simulated one way latency in ms")
+    parser.add_argument('--jitter', type=float, default=0,
+                        help="simulated latency jitter in ms")
+    parser.add_argument('--loss', type=float, default=0,
+                        help="simulated packet loss in percent")
+    parser.add_argument('--seed', type=int, default=1,
+                        help="seed for the game and the simulated network")
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args.port))
+    elif args.connect:
+        asyncio.run(play(args.connect, args.port))
+    else:
+        for players in args.players:
+            server, clients = asyncio.run(loopback(
+                players, args.seconds, args.latency, args.jitter, args.loss,
+                args.seed))
+            report(players, args.seconds, server, clients)
+            server.game.loader.shutdown()
+        pg.quit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""
+Soak test for leaks across many Asteroids games.
+
+Plays games back to back, headless with the bot pilot at the controls,
+tearing each one down with Game.teardown() when it ends. After a warm up
+the traced memory, the live sprites of each class and the group sizes are
+taken as a baseline; every --every games they are measured again, along
+with the process RSS. If traced memory, RSS or the live sprite count has
+grown past its threshold the biggest allocation changes since the
+baseline are printed and the exit status is 1, e.g.
+
+    python soak.py --games 2000 --every 100
+"""
+
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter
+import pygame as pg
+
+import asteroids
+
+GAMES = 1000
+EVERY = 50
+WARMUP = 20
+MAX_FRAMES = asteroids.FPS * 60
+MAX_GROWTH_KB = 2048
+MAX_RSS_MB = 64
+MAX_SPRITES = 32
+TOP = 15
+
+def rss_mb():
+    """Resident set size of this process in MB, or its peak if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+def live_sprites():
+    """Count the Sprite objects still alive, by class name."""
+    gc.collect()
+    return Counter(type(obj).__name__ for obj in gc.get_objects()
+                   if isinstance(obj, pg.sprite.Sprite))
+
+def group_sizes(game):
+    """Sizes of the game's groups, pools and entity arrays."""
+    sizes = {'all_sprites': len(game.all_sprites),
+             'bullets': len(game.bullets), 'rocks': len(game.rocks),
+             'explosions': len(game.explosions), 'ball': len(game.ball),
+             'bullet_pool': len(game.bullet_pool.free),
+             'explosion_pool': len(game.explosion_pool.free),
+             'grid_cells': len(game.grid.cells)}
+    if game.particles is not None:
+        sizes['particles'] = len(game.particles)
+    return sizes
+
+def play(game, max_frames):
+    """Play one game to its end, or max_frames, and tear it down."""
+    game.reset()
+    frames = 0
+    while game.playing and frames < max_frames:
+        game.update()
+        frames += 1
+    game.end_game()
+    game.teardown()
+    return frames
+
+def measure(game):
+    """Take a tracemalloc snapshot and the current counts."""
+    sprites = live_sprites()
+    return {'snapshot': tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'))),
+            'traced': tracemalloc.get_traced_memory()[0],
+            'rss': rss_mb(), 'sprites': sprites,
+            'groups': group_sizes(game)}
+
+def report(games, frames, seconds, base, now):
+    growth = (now['traced'] - base['traced']) / 1024
+    sprites = sum(now['sprites'].values()) - sum(base['sprites'].values())
+    print("{:6} games {:9} frames {:7.1f}s  traced {:+9.1f} kB  "
+          "rss {:7.1f} MB ({:+.1f})  sprites {} ({:+})".format(
+              games, frames, seconds, growth, now['rss'],
+              now['rss'] - base['rss'], sum(now['sprites'].values()),
+              sprites))
+    grown = {name: size for name, size in now['groups'].items()
+             if size > base['groups'].get(name, 0)}
+    if grown:
+        print("       groups grown: " + ", ".join(
+            "{} {}".format(name, size) for name, size in grown.items()))
+    return growth, now['rss'] - base['rss'], sprites
+
+def print_diff(base, now, top):
+    """Print the sprite classes and allocations that grew the most."""
+    sprites = now['sprites'] - base['sprites']
+    if sprites:
+        print("Sprites gained: " + ", ".join(
+            "{} {:+}".format(name, count)
+            for name, count in sprites.most_common()))
+    print("Top {} allocation changes since the baseline:".format(top))
+    for stat in now['snapshot'].compare_to(base['snapshot'], 'lineno')[:top]:
+        print("  " + str(stat))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--games', type=int, default=GAMES,
+                        help="games to play (default %(default)s)")
+    parser.add_argument('--every', type=int, default=EVERY,
+                        help="games between checks (default %(default)s)")
+    parser.add_argument('--warmup', type=int, default=WARMUP,
+                        help="games before the baseline (default %(default)s)")
+    parser.add_argument('--max-frames', type=int, default=MAX_FRAMES,
+                        help="end a game after this many frames "
+                             "(default %(default)s)")
+    parser.add_argument('--max-growth', type=float, default=MAX_GROWTH_KB,
+                        metavar='KB',
+                        help="allowed traced memory growth "
+                             "(default %(default)s)")
+    parser.add_argument('--max-rss', type=float, default=MAX_RSS_MB,
+                        metavar='MB',
+                        help="allowed RSS growth (default %(default)s)")
+    parser.add_argument('--max-sprites', type=int, default=MAX_SPRITES,
+                        help="allowed growth in live sprites "
+                             "(default %(default)s)")
+    parser.add_argument('--top', type=int, default=TOP,
+                        help="allocations to list on failure "
+                             "(default %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--vectorized', action='store_true',
+                        help="run with the NumPy entity engine")
+    args = parser.parse_args()
+
+    game = asteroids.Game(headless=True, vectorized=args.vectorized,
+                          seed=args.seed)
+    game.input = asteroids.BotPilot(game)
+    frames = 0
+    for number in range(args.warmup):
+        frames += play(game, args.max_frames)
+    tracemalloc.start()
+    base = measure(game)
+    start = time.perf_counter()
+    status = 0
+    for number in range(1, args.games + 1):
+        frames += play(game, args.max_frames)
+        if number % args.every and number != args.games:
+            continue
+        now = measure(game)
+        growth, rss, sprites = report(
+            number, frames, time.perf_counter() - start, base, now)
+        if (growth > args.max_growth or rss > args.max_rss
+                or sprites > args.max_sprites):
+            print("Leak after {} games: traced {:+.1f} kB, rss {:+.1f} MB, "
+                  "sprites {:+}".format(number, growth, rss, sprites))
+            print_diff(base, now, args.top)
+            status = 1
+            break
+    tracemalloc.stop()
+    game.loader.shutdown()
+    pg.quit()
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
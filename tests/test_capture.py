@@ -0,0 +1,68 @@
+"""Frame capture must drop frames rather than slow the game down."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import asteroids
+
+FRAMES = 180
+SLACK_MS = 8
+
+def paced_frame_ms(game, capture):
+    """Mean ms of update plus draw over FRAMES frames paced to FPS."""
+    game.reset()
+    game.capture = capture
+    total = 0.0
+    wake = time.perf_counter()
+    for frame in range(FRAMES):
+        start = time.perf_counter()
+        game.update()
+        game.draw()
+        total += time.perf_counter() - start
+        wake += 1 / asteroids.FPS
+        time.sleep(max(0.0, wake - time.perf_counter()))
+    game.capture = None
+    return total * 1000 / FRAMES
+
+class FrameCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.game = asteroids.Game(headless=True, seed=3)
+        self.game.input = asteroids.BotPilot(self.game)
+
+    def tearDown(self):
+        self.game.loader.shutdown()
+        shutil.rmtree(self.folder)
+
+    def test_frame_time_stays_flat(self):
+        plain = paced_frame_ms(self.game, None)
+        capture = asteroids.FrameCapture(self.game.screen, self.folder)
+        try:
+            captured = paced_frame_ms(self.game, capture)
+        finally:
+            capture.close()
+        self.assertLess(captured, plain + SLACK_MS)
+        self.assertEqual(capture.captured + capture.dropped, FRAMES)
+        self.assertEqual(capture.written, capture.captured)
+        self.assertEqual(len(os.listdir(self.folder)), capture.written)
+
+    def test_raw_stream(self):
+        capture = asteroids.FrameCapture(
+            self.game.screen, self.folder, (64, 36), fmt='raw')
+        self.game.reset()
+        self.game.capture = capture
+        for frame in range(10):
+            self.game.update()
+            self.game.draw()
+        self.game.capture = None
+        capture.close()
+        size = os.path.getsize(
+            os.path.join(self.folder, asteroids.CAPTURE_STREAM))
+        self.assertEqual(size, capture.written * 64 * 36 * 3)
+
+if __name__ == '__main__':
+    unittest.main()
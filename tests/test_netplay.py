@@ -0,0 +1,58 @@
+"""A delta snapshot must decode back to the state it was encoded from."""
+
+import unittest
+
+import netplay
+
+BASE = {1: (netplay.SHIP, 400, 400, 0, netplay.THRUST | 50),
+        2: (netplay.ROCK, 1000, 2000, 0xFFF0, 0x21),
+        3: (netplay.ROCK, 3000, 100, 90, 0x10),
+        4: (netplay.BULLET, 20, 20, 180, 0),
+        5: (netplay.BALL, 7, 9, 0, 0)}
+
+class SnapshotTest(unittest.TestCase):
+
+    def encode(self, state, base_tick=10, base=BASE):
+        return netplay.encode_snapshot(12, base_tick, base, state, 11,
+                                       250, 3, 1)
+
+    def test_round_trip(self):
+        state = dict(BASE)
+        state[1] = (netplay.SHIP, 527, 273, 200, 60)
+        state[2] = (netplay.ROCK, 1000, 2000, 0x0010, 0x21)
+        state[4] = (netplay.BULLET, 20 + 128, 20, 180, 0)
+        del state[3]
+        state[6] = (netplay.ROCK, 5119, 2879, 0xFFFF, 0x33)
+        data = self.encode(state)
+        header, decoded = netplay.decode_snapshot(data, {10: BASE})
+        self.assertEqual(decoded, state)
+        self.assertEqual(header, (netplay.SNAPSHOT, 12, 10, 11, 250, 3, 1,
+                                  2, 2, 1))
+        self.assertEqual(len(data), netplay.SNAP_HEADER.size
+                         + 2 * netplay.FULL_RECORD.size
+                         + 2 * netplay.DELTA_RECORD.size
+                         + netplay.REMOVED.size)
+
+    def test_kind_change_is_sent_in_full(self):
+        state = dict(BASE)
+        state[5] = (netplay.ROCK, 7, 9, 0, 0x10)
+        header, decoded = netplay.decode_snapshot(
+            self.encode(state), {10: BASE})
+        self.assertEqual(decoded, state)
+        self.assertEqual(header[-3:], (1, 0, 0))
+
+    def test_unchanged_costs_nothing(self):
+        data = self.encode(dict(BASE))
+        self.assertEqual(len(data), netplay.SNAP_HEADER.size)
+        self.assertEqual(netplay.decode_snapshot(data, {10: BASE})[1], BASE)
+
+    def test_full_snapshot(self):
+        data = self.encode(BASE, 0, {})
+        self.assertEqual(netplay.decode_snapshot(data, {})[1], BASE)
+
+    def test_unknown_base(self):
+        self.assertIsNone(
+            netplay.decode_snapshot(self.encode(BASE), {9: BASE}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""A session log must load back exactly as it was saved."""
+
+import os
+import tempfile
+import unittest
+
+import asteroids
+
+class SessionLogTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.file = tempfile.mkstemp(suffix='.log')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def round_trip(self, log):
+        log.save(self.file)
+        return asteroids.SessionLog.load(self.file)
+
+    def test_round_trip(self):
+        masks = bytes([0]) * 70000 + bytes([5, 5, 3]) + bytes([1]) * 65535
+        log = asteroids.SessionLog(42, asteroids.STEP_MS / 1000,
+                                   (1280, 720), True, masks,
+                                   [120, 0, 70000])
+        loaded = self.round_trip(log)
+        self.assertEqual(loaded.masks, masks)
+        self.assertEqual(loaded.scores, [120, 0, 70000])
+        self.assertEqual((loaded.seed, loaded.dt, loaded.size,
+                          loaded.vectorized),
+                         (42, log.dt, (1280, 720), True))
+
+    def test_empty(self):
+        loaded = self.round_trip(
+            asteroids.SessionLog(0, 0.01, (800, 600), False))
+        self.assertEqual(loaded.masks, b'')
+        self.assertEqual(loaded.scores, [])
+
+    def test_bad_magic(self):
+        with open(self.file, 'wb') as f:
+            f.write(b'\0' * asteroids.LOG_HEADER.size)
+        with self.assertRaises(ValueError):
+            asteroids.SessionLog.load(self.file)
+
+if __name__ == '__main__':
+    unittest.main()
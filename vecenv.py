@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+"""
+Batched Asteroids environment for bots and load tests.
+
+VecEnv runs N headless games spread over a pool of worker processes and
+steps them all at once. Every step takes an (N, 3) action array of
+rotate (-1 left, 0, 1 right), thrust (0 or 1) and fire (0 or 1) and
+returns the observations, the score gained as the reward and a done flag
+for every game. A game that ends is started again straight away, so the
+observation returned with done set is already that of the new game.
+
+Observations, actions, rewards and done flags live in shared memory, so
+each step only sends a one word command down a pipe to every worker.
+Requires numpy. Run it directly to measure the step rate, e.g.
+
+    python vecenv.py --envs 16 --workers 4 --steps 2000
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+import traceback
+from multiprocessing import shared_memory
+import numpy as np
+import pygame as pg
+
+import asteroids
+
+OBS_ROCKS = 8
+SHIP_FIELDS = 8
+BALL_FIELDS = 3
+ROCK_FIELDS = 3
+OBS_SIZE = SHIP_FIELDS + BALL_FIELDS + OBS_ROCKS * ROCK_FIELDS
+ACTION_SIZE = 3
+ENVS = 8
+STEPS = 1000
+
+class ActionInput:
+    """Input source that holds the keys for the last action given."""
+
+    def __init__(self):
+        self.keys = asteroids.KeyState()
+
+    def set(self, rotate, thrust, fire):
+        keys = []
+        if rotate < 0:
+            keys.append(pg.K_LEFT)
+        elif rotate > 0:
+            keys.append(pg.K_RIGHT)
+        if thrust:
+            keys.append(pg.K_UP)
+        if fire:
+            keys.append(pg.K_SPACE)
+        self.keys = asteroids.KeyState(keys)
+
+    def get_pressed(self):
+        return self.keys
+
+def observe(game, out):
+    """Write the game's observation into the OBS_SIZE row out.
+
+    The ship gives its position, velocity, heading, energy and lives.
+    The energy ball and the OBS_ROCKS nearest rocks follow as offsets from
+    the ship, taking the short way round the screen, and a 1 when present.
+    Positions are fractions of the screen size.
+    """
+    out[:] = 0
+    ship = game.ship
+    size = np.array((game.WIDTH, game.HEIGHT), dtype=np.float32)
+    center = np.array(ship.rect.center, dtype=np.float32)
+    radians = np.radians(ship.rot)
+    out[:SHIP_FIELDS] = (
+        center[0] / size[0], center[1] / size[1],
+        ship.vel.x / asteroids.SHIP_VEL, ship.vel.y / asteroids.SHIP_VEL,
+        np.cos(radians), np.sin(radians), ship.energy / 100.0,
+        game.my_lives / 3.0)
+    for ball in game.ball:
+        offset = (np.array(ball.rect.center) - center + size / 2) % size
+        out[SHIP_FIELDS:SHIP_FIELDS + 2] = (offset - size / 2) / size
+        out[SHIP_FIELDS + 2] = 1
+    if game.engine is not None:
+        rocks = game.engine.rocks
+        targets = rocks.centers(rocks.live())
+    else:
+        targets = np.array([rock.rect.center for rock in game.rocks])
+    if not len(targets):
+        return
+    offsets = (targets - center + size / 2) % size - size / 2
+    nearest = np.argsort((offsets ** 2).sum(1), kind='stable')[:OBS_ROCKS]
+    rows = out[SHIP_FIELDS + BALL_FIELDS:].reshape(OBS_ROCKS, ROCK_FIELDS)
+    rows[:len(nearest), :2] = offsets[nearest] / size
+    rows[:len(nearest), 2] = 1
+
+def attach(names, num_envs):
+    """Map the shared buffers and return them with their SharedMemory."""
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    arrays = buffers(blocks, num_envs)
+    return blocks, arrays
+
+def buffers(blocks, num_envs):
+    """Return obs, actions, rewards and dones views of the blocks."""
+    return (np.ndarray((num_envs, OBS_SIZE), np.float32, blocks[0].buf),
+            np.ndarray((num_envs, ACTION_SIZE), np.int8, blocks[1].buf),
+            np.ndarray(num_envs, np.float32, blocks[2].buf),
+            np.ndarray(num_envs, np.bool_, blocks[3].buf))
+
+def worker(conn, names, num_envs, start, stop, seed, vectorized, size):
+    """Run games start to stop until told to close.
+
+    'ready' is sent once the games are set up. Commands then arrive on
+    conn as 'reset', 'step' or 'close'; each is answered once the shared
+    buffers have been written. Any error is sent back as ('error',
+    traceback) and ends the worker.
+    """
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    blocks = []
+    games = []
+    try:
+        blocks, (obs, actions, rewards, dones) = attach(names, num_envs)
+        for index in range(start, stop):
+            game = asteroids.Game(
+                headless=True, input_source=ActionInput(),
+                vectorized=vectorized,
+                seed=None if seed is None else seed + index, size=size)
+            games.append(game)
+        conn.send('ready')
+        while True:
+            command = conn.recv()
+            if command == 'close':
+                break
+            for index, game in enumerate(games, start):
+                if command == 'reset':
+                    game.reset()
+                    rewards[index] = 0
+                    dones[index] = False
+                else:
+                    game.input.set(*actions[index])
+                    score = game.my_score
+                    game.update()
+                    rewards[index] = game.my_score - score
+                    dones[index] = not game.playing
+                    if not game.playing:
+                        game.end_game()
+                        game.reset()
+                observe(game, obs[index])
+            conn.send(command)
+    except Exception:
+        try:
+            conn.send(('error', traceback.format_exc()))
+        except OSError:
+            pass
+    finally:
+        for game in games:
+            game.loader.shutdown()
+        pg.quit()
+        for block in blocks:
+            block.close()
+        conn.close()
+
+class VecEnv:
+    """num_envs headless games stepped together over worker processes.
+
+    Game i is seeded with seed + i, so a run can be repeated. workers
+    defaults to the number of CPUs, and never exceeds num_envs. A worker
+    that fails or dies raises RuntimeError in the call waiting on it.
+    """
+
+    def __init__(self, num_envs=ENVS, workers=None, seed=0, vectorized=False,
+                 size=None):
+        self.num_envs = num_envs
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, num_envs))
+        nbytes = (num_envs * OBS_SIZE * 4, num_envs * ACTION_SIZE,
+                  num_envs * 4, num_envs)
+        self.blocks = [shared_memory.SharedMemory(create=True, size=n)
+                       for n in nbytes]
+        self.obs, self.actions, self.rewards, self.dones = buffers(
+            self.blocks, num_envs)
+        names = [block.name for block in self.blocks]
+        self.conns = []
+        self.processes = []
+        self.closed = False
+        for number in range(workers):
+            start = num_envs * number // workers
+            stop = num_envs * (number + 1) // workers
+            parent, child = mp.Pipe()
+            process = mp.Process(
+                target=worker, daemon=True,
+                args=(child, names, num_envs, start, stop, seed, vectorized,
+                      size))
+            process.start()
+            child.close()
+            self.conns.append(parent)
+            self.processes.append(process)
+        try:
+            for conn in self.conns:
+                self.receive(conn)
+        except RuntimeError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, command):
+        """Send command to every worker and wait for them all."""
+        for conn in self.conns:
+            try:
+                conn.send(command)
+            except OSError:
+                raise RuntimeError("a VecEnv worker exited") from None
+        for conn in self.conns:
+            self.receive(conn)
+
+    def receive(self, conn):
+        """Wait for a worker's reply, raising its error if it failed."""
+        try:
+            reply = conn.recv()
+        except EOFError:
+            raise RuntimeError("a VecEnv worker exited") from None
+        if isinstance(reply, tuple):
+            raise RuntimeError("VecEnv worker failed:\n" + reply[1])
+        return reply
+
+    def reset(self):
+        """Start every game afresh and return the observations."""
+        self.send('reset')
+        return self.obs.copy()
+
+    def step(self, actions):
+        """Step every game once with actions.
+
+        Returns copies of the observations, rewards and done flags.
+        """
+        self.actions[:] = actions
+        self.send('step')
+        return self.obs.copy(), self.rewards.copy(), self.dones.copy()
+
+    def close(self):
+        """Stop the workers and free the shared memory."""
+        if self.closed:
+            return
+        self.closed = True
+        for conn in self.conns:
+            try:
+                conn.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        for conn in self.conns:
+            conn.close()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+def main():
+    """Step random actions through a VecEnv and report the rate."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--envs', type=int, default=ENVS,
+                        help="games to run at once (default %(default)s)")
+    parser.add_argument('--workers', type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--steps', type=int, default=STEPS,
+                        help="steps to run (default %(default)s)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed of the first game (default %(default)s)")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="use the NumPy entity engine in every game")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with VecEnv(args.envs, args.workers, args.seed, args.vectorized) as env:
+        env.reset()
+        games = 0
+        start = time.perf_counter()
+        for step in range(args.steps):
+            actions = np.column_stack((
+                rng.integers(-1, 2, args.envs),
+                rng.integers(0, 2, (args.envs, 2))))
+            obs, rewards, dones = env.step(actions)
+            games += dones.sum()
+        seconds = time.perf_counter() - start
+    frames = args.steps * args.envs
+    print("{} envs on {} workers: {} frames, {} games in {:.2f}s: "
+          "{:.0f} frames/s".format(args.envs, len(env.processes), frames,
+                                   games, seconds, frames / seconds))
+
+if __name__ == '__main__':
+    main()